@@ -2,6 +2,7 @@ from django.contrib import admin
 from .models import (
     Category,
     Product,
+    BranchPrice,
     Cart,
     CartItem,
     Order,
@@ -11,6 +12,7 @@ from .models import (
     NewsletterSubscriber,
     UserProfile,
     PointsTransaction,
+    Job,
 )
 
 # 🗂️ Category Admin
@@ -29,6 +31,15 @@ class ProductAdmin(admin.ModelAdmin):
     list_editable = ('price', 'available')
 
 
+# 🏪 Branch Price Admin
+@admin.register(BranchPrice)
+class BranchPriceAdmin(admin.ModelAdmin):
+    list_display = ('product', 'branch', 'price', 'discount_price')
+    list_filter = ('branch',)
+    search_fields = ('product__name',)
+    list_editable = ('price', 'discount_price')
+
+
 # 🛒 Cart Admin
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
@@ -95,3 +106,11 @@ class PointsTransactionAdmin(admin.ModelAdmin):
     list_display = ("user", "kind", "points", "amount", "order_id", "created_at")
     list_filter = ("kind", "created_at")
     search_fields = ("user__username", "order_id", "note")
+
+
+# ⚙️ Background Jobs Admin
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "task")
+    readonly_fields = ("locked_by", "locked_until", "last_error", "created_at", "finished_at")
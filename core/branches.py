@@ -0,0 +1,70 @@
+# core/branches.py
+import threading
+import time
+from django.core.cache import cache
+from .models import Branch
+
+# Branches change rarely, so each worker keeps them in memory. Branch save/delete bumps
+# this shared stamp (see core/signals.py) and every worker reloads on its next lookup.
+BRANCH_VERSION_KEY = "branches:version"
+
+
+class BranchRegistry:
+    """Immutable snapshot of every branch, ordered by id."""
+
+    def __init__(self, branches):
+        self.branches = tuple(branches)
+        self.by_id = {branch.id: branch for branch in self.branches}
+        # main branch if there is one, otherwise the first
+        self.main = next((b for b in self.branches if b.is_main), self.branches[0] if self.branches else None)
+
+
+_lock = threading.Lock()
+_registry = None
+_registry_version = None
+
+
+def get_branch_version() -> int:
+    version = cache.get(BRANCH_VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(BRANCH_VERSION_KEY, version, None):
+            version = cache.get(BRANCH_VERSION_KEY, version)
+    return version
+
+
+def bump_branch_version() -> int:
+    global _registry
+    _registry = None
+    try:
+        return cache.incr(BRANCH_VERSION_KEY)
+    except ValueError:
+        return get_branch_version()
+
+
+def get_registry() -> BranchRegistry:
+    """The worker's branch registry; one query per worker until a branch changes."""
+    global _registry, _registry_version
+    version = get_branch_version()
+    registry = _registry
+    if registry is None or _registry_version != version:
+        registry = BranchRegistry(Branch.objects.order_by('id'))
+        with _lock:
+            _registry, _registry_version = registry, version
+    return registry
+
+
+def all_branches():
+    return get_registry().branches
+
+
+def main_branch():
+    return get_registry().main
+
+
+def get_branch(branch_id):
+    """Branch for an id (as stored in the session or posted by a form), or None."""
+    try:
+        return get_registry().by_id.get(int(branch_id))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,403 @@
+# core/cart.py
+from decimal import Decimal
+
+from django.core import signing
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Cart, CartItem, Product
+from .money import to_rupees
+from .pricing import lines_total_paisa, price_products, price_rows
+
+# Guests keep their cart in a signed cookie: browsing and adding items never writes
+# to the database. It is merged into the user's Cart on login (see core/signals.py).
+GUEST_CART_COOKIE = "guest_cart"
+GUEST_CART_SALT = "core.cart.guest"
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 14
+GUEST_CART_MAX_LINES = 50
+MAX_LINE_QUANTITY = 99  # per line, guest and user carts alike
+SESSION_BRANCH_KEY = "selected_branch_id"  # same key as core.views
+
+
+class GuestCartItem:
+    """Quacks like CartItem for templates; `id` is the product id."""
+
+    def __init__(self, product, quantity):
+        self.id = product.id
+        self.product = product
+        self.quantity = quantity
+
+    def total_price(self) -> Decimal:
+        return to_rupees(self.product.quote.unit_paisa * self.quantity)
+
+
+class GuestCart:
+    """{product_id: quantity} read from and written back to the signed cookie."""
+
+    def __init__(self, lines=None, branch_id=None):
+        self.lines = dict(lines or {})
+        self.branch_id = branch_id  # prices follow the selected branch
+        self.modified = False
+
+    @classmethod
+    def from_request(cls, request):
+        raw = request.COOKIES.get(GUEST_CART_COOKIE)
+        if not raw:
+            return cls()
+        try:
+            data = signing.loads(raw, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE)
+            return cls({int(pid): int(qty) for pid, qty in data.items() if int(qty) > 0})
+        except (signing.BadSignature, AttributeError, TypeError, ValueError):
+            return cls()
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def count(self) -> int:
+        return sum(self.lines.values())
+
+    def add(self, product_id, quantity=1):
+        self.set(product_id, self.lines.get(product_id, 0) + quantity)
+
+    def set(self, product_id, quantity):
+        if quantity <= 0:
+            self.remove(product_id)
+            return
+        if product_id not in self.lines and len(self.lines) >= GUEST_CART_MAX_LINES:
+            return
+        self.lines[product_id] = min(quantity, MAX_LINE_QUANTITY)
+        self.modified = True
+
+    def remove(self, product_id):
+        if self.lines.pop(product_id, None) is not None:
+            self.modified = True
+
+    def clear(self):
+        if self.lines:
+            self.lines = {}
+            self.modified = True
+
+    def items(self):
+        """GuestCartItems in the order they were added; one query, unknown products dropped."""
+        if not self.lines:
+            return []
+        products = Product.objects.in_bulk(list(self.lines))
+        price_products(products.values(), self.branch_id)
+        return [GuestCartItem(products[pid], qty) for pid, qty in self.lines.items() if pid in products]
+
+    def save(self, response):
+        if not self.modified:
+            return
+        if self.lines:
+            response.set_cookie(
+                GUEST_CART_COOKIE,
+                signing.dumps({str(pid): qty for pid, qty in self.lines.items()}, salt=GUEST_CART_SALT, compress=True),
+                max_age=GUEST_CART_MAX_AGE,
+                httponly=True,
+                samesite="Lax",
+            )
+        else:
+            response.delete_cookie(GUEST_CART_COOKIE, samesite="Lax")
+        self.modified = False
+
+
+# ---------------------------
+# Atomic cart mutations (logged-in users)
+# ---------------------------
+# Each line change is one statement keyed on the user, so double taps can neither create
+# duplicate lines (unique_cart_product) nor lose increments (quantity + n in SQL). The
+# Cart.item_count / total_paisa delta is applied in the same transaction, priced for
+# Cart.branch (the branch the totals were last computed for).
+# Every writer locks the Cart row before it touches lines (checkout and guest merge too),
+# so a checkout racing a quantity edit queues behind it instead of deadlocking.
+UPSERT_VENDORS = ("sqlite", "postgresql")
+
+
+def _upsert_sql():
+    item, cart = CartItem._meta.db_table, Cart._meta.db_table
+    return (
+        f"INSERT INTO {item} (cart_id, product_id, quantity, added_at) "
+        f"SELECT c.id, %s, %s, %s FROM {cart} c WHERE c.user_id = %s "
+        f"ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = {item}.quantity + excluded.quantity"
+    )
+
+
+def _lock_cart(user):
+    """Lock the user's Cart row; its id, or None when the user has no cart yet."""
+    return Cart.objects.select_for_update().filter(user=user).values_list("id", flat=True).first()
+
+
+def _apply_totals(carts, quantity_delta, paisa_delta):
+    return carts.update(
+        item_count=F("item_count") + quantity_delta,
+        total_paisa=F("total_paisa") + paisa_delta,
+    )
+
+
+@transaction.atomic
+def add_item(user, product, quantity=1, branch=None):
+    """
+    Add `quantity` of a product to the user's cart (INSERT .. ON CONFLICT) and bump the
+    totals, priced for `branch`. A cart priced for another branch is re-priced instead.
+    The line is capped at MAX_LINE_QUANTITY.
+    """
+    product_id = product.pk
+    branch_id = getattr(branch, "pk", branch)
+    cart_id = _lock_cart(user)
+    if cart_id is None:
+        # users created before carts were auto-created have no Cart row yet
+        cart_id = Cart.objects.get_or_create(user=user)[0].pk
+        _lock_cart(user)
+    # the cart is locked, so the line cannot change between this read and the write
+    current = CartItem.objects.filter(cart_id=cart_id, product_id=product_id).values_list("quantity", flat=True).first()
+    quantity = min(quantity, MAX_LINE_QUANTITY - (current or 0))
+    if quantity <= 0:
+        return
+    if connection.vendor in UPSERT_VENDORS:
+        with connection.cursor() as cursor:
+            cursor.execute(_upsert_sql(), [product_id, quantity, timezone.now(), user.pk])
+    else:
+        # other backends: increment, else insert; the unique constraint settles races
+        items = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+        if not items.update(quantity=F("quantity") + quantity):
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+            except IntegrityError:
+                items.update(quantity=F("quantity") + quantity)
+    unit = price_products([product], branch_id)[0].quote.unit_paisa
+    if not _apply_totals(Cart.objects.filter(user=user, branch_id=branch_id), quantity, quantity * unit):
+        reprice_cart(user, branch_id, force=True)
+
+
+def _locked_line(user, item_id):
+    return (
+        CartItem.objects.select_for_update(of=("self",))  # lock the line only, not Cart/Product
+        .filter(id=item_id, cart__user=user)
+        .values_list("cart_id", "cart__branch_id", "quantity", "product_id", "product__price", "product__discount_price")
+        .first()
+    )
+
+
+def _line_unit_paisa(branch_id, product_id, price, discount_price):
+    return price_rows([(product_id, price, discount_price)], branch_id)[product_id].unit_paisa
+
+
+@transaction.atomic
+def set_quantity(user, item_id, quantity) -> bool:
+    """
+    Set a line's quantity (<= 0 removes it; capped at MAX_LINE_QUANTITY).
+    False if the line is not in the user's cart.
+    """
+    if quantity <= 0:
+        return remove_item(user, item_id)
+    quantity = min(quantity, MAX_LINE_QUANTITY)
+    _lock_cart(user)
+    line = _locked_line(user, item_id)
+    if line is None:
+        return False
+    cart_id, branch_id, old, *product = line
+    CartItem.objects.filter(id=item_id).update(quantity=quantity)
+    _apply_totals(Cart.objects.filter(id=cart_id), quantity - old, (quantity - old) * _line_unit_paisa(branch_id, *product))
+    return True
+
+
+@transaction.atomic
+def remove_item(user, item_id) -> bool:
+    _lock_cart(user)
+    line = _locked_line(user, item_id)
+    if line is None:
+        return False
+    cart_id, branch_id, old, *product = line
+    CartItem.objects.filter(id=item_id).delete()
+    _apply_totals(Cart.objects.filter(id=cart_id), -old, -old * _line_unit_paisa(branch_id, *product))
+    return True
+
+
+@transaction.atomic
+def update_quantities(user, quantities) -> int:
+    """
+    Apply {item_id: quantity} for many lines at once: one locking read validates the ids
+    against the user's cart, then one bulk_update, one delete and one totals delta.
+    Ids not in the cart are ignored and quantities are capped at MAX_LINE_QUANTITY.
+    Returns the number of lines changed.
+    """
+    _lock_cart(user)
+    lines = list(
+        CartItem.objects.select_for_update(of=("self",))  # lines only; Cart/Product are read, not locked
+        .filter(cart__user=user, id__in=list(quantities))
+        .select_related("product", "cart")
+        .order_by("id")  # same lock order in every request, so two batches cannot deadlock
+    )
+    if lines:
+        price_products([line.product for line in lines], lines[0].cart.branch_id)
+    changed, removed, quantity_delta, paisa_delta = [], [], 0, 0
+    for line in lines:
+        quantity = min(max(0, quantities[line.id]), MAX_LINE_QUANTITY)
+        if quantity == line.quantity:
+            continue
+        delta = quantity - line.quantity
+        quantity_delta += delta
+        paisa_delta += delta * line.product.quote.unit_paisa
+        if quantity:
+            line.quantity = quantity
+            changed.append(line)
+        else:
+            removed.append(line.id)
+    if changed:
+        CartItem.objects.bulk_update(changed, ["quantity"])
+    if removed:
+        CartItem.objects.filter(id__in=removed).delete()
+    if changed or removed:
+        _apply_totals(Cart.objects.filter(id=lines[0].cart_id), quantity_delta, paisa_delta)
+    return len(changed) + len(removed)
+
+
+def recompute_cart_totals(cart_ids):
+    """
+    Rebuild item_count / total_paisa from the lines, e.g. after a price change or bulk edit.
+    Each cart is priced for its own branch.
+    """
+    carts = Cart.objects.in_bulk(set(cart_ids))
+    if not carts:
+        return
+    lines = {}
+    for cart_id, *line in CartItem.objects.filter(cart_id__in=list(carts)).values_list(
+        "cart_id", "quantity", "product_id", "product__price", "product__discount_price"
+    ):
+        lines.setdefault(cart_id, []).append(line)
+    for cart in carts.values():
+        rows = lines.get(cart.id, [])
+        quotes = price_rows([row[1:] for row in rows], cart.branch_id)
+        cart.item_count = sum(quantity for quantity, *_ in rows)
+        cart.total_paisa = sum(quantity * quotes[product_id].unit_paisa for quantity, product_id, *_ in rows)
+    Cart.objects.bulk_update(carts.values(), ["item_count", "total_paisa"])
+
+
+def reprice_cart(user, branch, force=False):
+    """
+    Price the user's cart for `branch` (after a branch switch or login). Costs one UPDATE
+    when the cart is already priced for that branch.
+    """
+    branch_id = getattr(branch, "pk", branch)
+    carts = Cart.objects.filter(user=user)
+    if not force:
+        carts = carts.exclude(branch_id=branch_id) if branch_id else carts.filter(branch__isnull=False)
+    cart_ids = list(carts.values_list("id", flat=True))
+    if cart_ids:
+        Cart.objects.filter(id__in=cart_ids).update(branch_id=branch_id)
+        recompute_cart_totals(cart_ids)
+
+
+def clear_cart(cart):
+    """Delete every line and zero the totals."""
+    with transaction.atomic():
+        # the Cart row first, in the same lock order as every other cart writer
+        Cart.objects.filter(pk=cart.pk).update(item_count=0, total_paisa=0)
+        CartItem.objects.filter(cart=cart).delete()
+
+
+def get_guest_cart(request) -> GuestCart:
+    """The request's guest cart, parsed once; GuestCartMiddleware writes changes back."""
+    cart = getattr(request, "_guest_cart", None)
+    if cart is None:
+        cart = request._guest_cart = GuestCart.from_request(request)
+        cart.branch_id = request.session.get(SESSION_BRANCH_KEY) if hasattr(request, "session") else None
+    return cart
+
+
+def merge_guest_cart(request, user) -> int:
+    """
+    Fold the guest cart into the user's Cart in one transaction, adding quantities in SQL
+    (quantity = quantity + n, the same upsert as add_item) so a concurrent login or cart
+    edit cannot lose an increment. Empties the cookie. Returns the number of lines merged.
+    """
+    guest = get_guest_cart(request)
+    if not guest:
+        return 0
+    with transaction.atomic():
+        Cart.objects.get_or_create(user=user)
+        # cart edits update this row too, so their totals deltas queue behind the recompute
+        cart = Cart.objects.select_for_update().get(user=user)
+        if cart.branch_id != guest.branch_id:
+            Cart.objects.filter(pk=cart.pk).update(branch_id=guest.branch_id)
+        product_ids = set(Product.objects.filter(id__in=list(guest.lines)).values_list("id", flat=True))
+        lines = [(pid, qty) for pid, qty in guest.lines.items() if pid in product_ids]
+        if connection.vendor in UPSERT_VENDORS:
+            now = timezone.now()
+            with connection.cursor() as cursor:
+                cursor.executemany(_upsert_sql(), [[pid, qty, now, user.pk] for pid, qty in lines])
+        else:
+            for pid, qty in lines:
+                items = CartItem.objects.filter(cart=cart, product_id=pid)
+                if not items.update(quantity=F("quantity") + qty):
+                    try:
+                        with transaction.atomic():
+                            CartItem.objects.create(cart=cart, product_id=pid, quantity=qty)
+                    except IntegrityError:
+                        items.update(quantity=F("quantity") + qty)
+        CartItem.objects.filter(cart=cart, quantity__gt=MAX_LINE_QUANTITY).update(quantity=MAX_LINE_QUANTITY)
+        recompute_cart_totals([cart.id])
+    guest.clear()
+    return len(product_ids)
+
+
+# ---------------------------
+# Cart API payloads
+# ---------------------------
+def line_payload(item):
+    """JSON for one cart line (CartItem or GuestCartItem); None once it is gone."""
+    if item is None:
+        return None
+    unit = item.product.quote.unit_paisa
+    return {
+        "id": item.id,
+        "product_id": item.product.id,
+        "name": item.product.name,
+        "quantity": item.quantity,
+        "unit_price": str(to_rupees(unit)),
+        "total": str(to_rupees(unit * item.quantity)),
+    }
+
+
+def user_lines(user):
+    """The user's CartItems with products, priced for the cart's branch (one query)."""
+    lines = list(CartItem.objects.filter(cart__user=user).select_related("product", "cart"))
+    if lines:
+        price_products([line.product for line in lines], lines[0].cart.branch_id)
+    return lines
+
+
+def find_line(request, item_id=None, product_id=None):
+    """The current line by CartItem id (guests: product id) or by product, in one query."""
+    if not request.user.is_authenticated:
+        pid = product_id if product_id is not None else item_id
+        return next((item for item in get_guest_cart(request).items() if item.product.id == pid), None)
+    lines = CartItem.objects.filter(cart__user=request.user).select_related("product", "cart")
+    line = lines.filter(id=item_id).first() if item_id is not None else lines.filter(product_id=product_id).first()
+    if line is not None:
+        price_products([line.product], line.cart.branch_id)
+    return line
+
+
+def cart_totals_paisa(request):
+    """(item count, total paisa); one Cart row for users, the cookie lines for guests."""
+    if not request.user.is_authenticated:
+        items = get_guest_cart(request).items()
+        return sum(i.quantity for i in items), lines_total_paisa(items)
+    row = Cart.objects.filter(user=request.user).values_list("item_count", "total_paisa").first()
+    return row or (0, 0)
+
+
+def cart_totals(request):
+    """(item count, total Rs) for the navbar badge and cart header."""
+    count, paisa = cart_totals_paisa(request)
+    return count, to_rupees(paisa)
+
+
+def cart_summary(request):
+    """{'count': n, 'total': 'Rs'} for the cart API."""
+    count, total = cart_totals(request)
+    return {"count": count, "total": str(total)}
@@ -0,0 +1,76 @@
+# core/checkout.py
+from django.db import transaction
+
+from .cart import clear_cart
+from .idempotency import claim
+from .jobs import enqueue
+from .models import Cart, CartItem, IdempotencyKey, OrderItem
+from .pricing import price_rows
+
+
+class CheckoutError(Exception):
+    """The cart cannot be turned into an order (empty, or an item is no longer sold)."""
+
+
+class DuplicateCheckout(Exception):
+    """The idempotency key was already used; `order` is the order it produced."""
+
+    def __init__(self, order):
+        super().__init__(f"Checkout already processed (order #{order.id if order else '?'})")
+        self.order = order
+
+
+@transaction.atomic
+def place_order(user, order, idempotency_key=None):
+    """
+    Turn the user's cart into `order` (an unsaved Order carrying the form fields) in one
+    transaction: lock the cart, re-price every line in one query (for order.branch), save the order,
+    bulk-create its items, empty the cart and queue the loyalty award (core.tasks), which
+    commits with the order and runs after the response.
+    The statement count does not grow with the number of lines; any failure rolls
+    the whole order back.
+
+    With an idempotency key the key is claimed first; a replay raises DuplicateCheckout
+    carrying the original order instead of placing a second one.
+    """
+    record = None
+    if idempotency_key:
+        record, created = claim(user, IdempotencyKey.CHECKOUT, idempotency_key)
+        if not created:
+            raise DuplicateCheckout(record.order)
+
+    cart = Cart.objects.select_for_update().filter(user=user).first()
+    if cart is None:
+        raise CheckoutError("Your cart is empty.")
+
+    lines = list(
+        CartItem.objects.filter(cart=cart).values_list(
+            "product_id", "product__name", "product__available", "product__price", "product__discount_price", "quantity"
+        )
+    )
+    if not lines:
+        raise CheckoutError("Your cart is empty.")
+    unavailable = [name for _, name, available, _, _, _ in lines if not available]
+    if unavailable:
+        raise CheckoutError(f"No longer available: {', '.join(unavailable)}. Please remove it from your cart.")
+
+    quotes = price_rows([(product_id, price, discount) for product_id, _, _, price, discount, _ in lines], order.branch_id)
+    items, total = [], 0  # paisa
+    for product_id, _, _, _, _, quantity in lines:
+        quote = quotes[product_id]
+        items.append(OrderItem(product_id=product_id, quantity=quantity, price=quote.unit))
+        total += quote.unit_paisa * quantity
+
+    order.user = user
+    order.total_paisa = total
+    order.save()
+    for item in items:
+        item.order = order
+    OrderItem.objects.bulk_create(items)
+
+    clear_cart(cart)
+    enqueue("loyalty.award_order_points", user_id=user.pk, order_id=order.id, total_paisa=total)
+    if record is not None:
+        record.order = order
+        record.save(update_fields=["order"])
+    return order
@@ -0,0 +1,74 @@
+# core/conditional.py
+"""
+ETag / Last-Modified validators for django.views.decorators.http.condition.
+
+Pages also show the navbar (cart badge, loyalty points), so validators for logged-in
+users include those values; they come from the same per-request data the context
+processor renders from, so a 304 costs at most those two small queries and a full
+render reuses them.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.utils.translation import get_language
+
+from .cart import get_guest_cart
+from .context_processors import request_data
+from .menu import get_catalog_version
+from .models import Order
+
+
+def _conditional(request):
+    # pending messages must be rendered, and POSTs are never answered with 304
+    return request.method in ('GET', 'HEAD') and not len(get_messages(request))
+
+
+def _visitor_parts(request):
+    parts = [get_language() or '', request.session.get('selected_branch_id') or '']
+    if request.user.is_authenticated:
+        data = request_data(request)
+        parts += [request.user.pk, data.cart_item_count, data.cart_totals[1], data.loyalty_balance]
+    else:
+        parts.append(get_guest_cart(request).count)
+    return parts
+
+
+def _etag(*parts):
+    return hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def catalog_etag(request, *args, **kwargs):
+    """Menu/product pages change only when the catalog version does."""
+    if not _conditional(request):
+        return None
+    return _etag("catalog", get_catalog_version(), request.get_full_path(), *_visitor_parts(request))
+
+
+def _order_state(request, order_id):
+    """(status, updated_at) of the user's order, read once per request."""
+    if not request.user.is_authenticated:
+        return None
+    if not hasattr(request, '_order_state'):
+        request._order_state = (
+            Order.objects.filter(id=order_id, user=request.user)
+            .values_list('status', 'updated_at')
+            .first()
+        )
+    return request._order_state
+
+
+def order_etag(request, order_id, *args, **kwargs):
+    if not _conditional(request):
+        return None
+    state = _order_state(request, order_id)
+    if state is None:
+        return None
+    status, updated_at = state
+    return _etag("order", order_id, status, updated_at.isoformat(), request.path, *_visitor_parts(request))
+
+
+def order_last_modified(request, order_id, *args, **kwargs):
+    if not _conditional(request):
+        return None
+    state = _order_state(request, order_id)
+    return state[1] if state else None
@@ -1,6 +1,8 @@
 # core/context_processors.py
-from django.db.models import Sum
-from .models import Branch, Cart, CartItem
+from django.utils.functional import SimpleLazyObject, cached_property
+from .branches import all_branches, get_branch, main_branch
+from .cart import cart_totals_paisa, get_guest_cart, user_lines
+from .money import to_rupees
 
 # ---------------------------
 # Branch Context
@@ -9,77 +11,82 @@ def branch_context(request):
     """
     Adds available branches and selected branch (from session) to templates.
     """
-    branches = Branch.objects.all()
-    selected_branch = None
-    selected_id = request.session.get('selected_branch')
-
-    if selected_id:
-        try:
-            selected_branch = Branch.objects.get(id=selected_id)
-        except Branch.DoesNotExist:
-            selected_branch = None
-
     return {
-        'available_branches': branches,
-        'selected_branch': selected_branch
+        'available_branches': all_branches(),
+        'selected_branch': get_branch(request.session.get('selected_branch')),
     }
 
 
 # ---------------------------
-# Cart Item Count (for navbar badge)
+# Cart + Branch + Loyalty Context (lazy, one provider)
 # ---------------------------
-def cart_item_count(request):
+class _RequestData:
     """
-    Returns total quantity in the authenticated user's cart (sum of CartItem.quantity).
+    Per-request holder for navbar data. Every value is computed on first access
+    and shared by all templates rendered during the same request.
     """
-    total = 0
-    if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
-        if cart:
-            total = CartItem.objects.filter(cart=cart).aggregate(total=Sum('quantity'))['total'] or 0
 
-    return {'cart_item_count': total}
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
 
+    @cached_property
+    def cart_items(self):
+        # one query; no separate Cart lookup needed
+        if not self.user.is_authenticated:
+            return get_guest_cart(self.request).items()
+        return user_lines(self.user)
 
-# ---------------------------
-# Cart + Branch + Loyalty Context (Main)
-# ---------------------------
-def cart_and_branch_context(request):
-    """
-    Provides cart items, cart total, active branch, and loyalty balance.
-    """
-    cart_items = []
-    cart_total = 0
-    active_branch = None
-    loyalty_balance = 0
+    @cached_property
+    def cart_totals(self):
+        # single Cart row read (denormalized item_count / total_paisa)
+        return cart_totals_paisa(self.request)
 
-    # ✅ User ka cart fetch
-    if request.user.is_authenticated:
-        cart = Cart.objects.filter(user=request.user).first()
-        if cart:
-            cart_items = cart.cart_items.select_related('product')
-            cart_total = sum(item.product.price * item.quantity for item in cart_items)
+    @cached_property
+    def cart_total(self):
+        return to_rupees(self.cart_totals[1])
 
-        # ✅ Active Branch
-        active_branch = Branch.objects.filter(is_main=True).first()
-        if not active_branch:
-            active_branch = Branch.objects.first()
+    @cached_property
+    def cart_item_count(self):
+        if not self.user.is_authenticated:
+            return get_guest_cart(self.request).count  # straight from the cookie
+        return self.cart_totals[0]
 
-        # ✅ Loyalty Balance
+    @cached_property
+    def active_branch(self):
+        return main_branch()
+
+    @cached_property
+    def loyalty_balance(self):
+        if not self.user.is_authenticated:
+            return 0
         try:
             from .loyalty import get_profile
-            loyalty_balance = get_profile(request.user).points_balance
+            return get_profile(self.user).points_balance
         except Exception:
-            loyalty_balance = 0
+            return 0
+
+
+def request_data(request):
+    """The request's shared _RequestData (also used by core.conditional for ETags)."""
+    data = getattr(request, '_context_data', None)
+    if data is None:
+        data = request._context_data = _RequestData(request)
+    return data
 
-    else:
-        # Guest user
-        active_branch = Branch.objects.filter(is_main=True).first() or Branch.objects.first()
-        loyalty_balance = 0
+
+def request_context(request):
+    """
+    Provides cart items, cart total, cart item count, active branch and loyalty balance.
+    Values are lazy: nothing is queried unless a template reads it, so redirects and
+    JSON responses cost no queries.
+    """
+    data = request_data(request)
 
     return {
-        'cart_items': cart_items,
-        'cart_total': cart_total,
-        'active_branch': active_branch,
-        'loyalty_balance': loyalty_balance,
+        'cart_items': SimpleLazyObject(lambda: data.cart_items),
+        'cart_total': SimpleLazyObject(lambda: data.cart_total),
+        'cart_item_count': SimpleLazyObject(lambda: data.cart_item_count),
+        'active_branch': SimpleLazyObject(lambda: data.active_branch),
+        'loyalty_balance': SimpleLazyObject(lambda: data.loyalty_balance),
     }
@@ -0,0 +1,239 @@
+# core/fuzzy.py
+import copy
+import re
+import threading
+from collections import defaultdict
+from django.db import transaction
+from .menu import bump_catalog_version, get_catalog_version, get_categories, get_menu_snapshot
+
+# ---------------------------
+# Roman-Urdu / Urdu spelling table
+# ---------------------------
+# canonical spelling -> other ways customers type it (Roman-Urdu variants and Urdu script)
+SYNONYMS = {
+    "biryani": ["biriyani", "biriani", "briyani", "biryaani", "beryani", "بریانی", "بریانى"],
+    "pulao": ["pilau", "pilaf", "pulav", "palao", "pullao", "پلاؤ", "پلاو"],
+    "karahi": ["karhai", "karai", "kadai", "kadhai", "karahee", "کڑاہی", "کڑھائی"],
+    "tikka": ["tika", "tikkah", "تکہ"],
+    "kabab": ["kebab", "kabob", "kebap", "کباب"],
+    "seekh": ["seek", "sheekh", "seekhh", "سیخ"],
+    "naan": ["nan", "نان"],
+    "roti": ["rotti", "chapati", "chapatti", "روٹی"],
+    "paratha": ["parantha", "parotta", "prata", "پراٹھا"],
+    "haleem": ["halim", "haleemm", "حلیم"],
+    "nihari": ["nahari", "nehari", "نہاری"],
+    "qorma": ["korma", "kurma", "قورمہ"],
+    "daal": ["dal", "dhal", "دال"],
+    "chicken": ["murgh", "murg", "chiken", "chikken", "مرغ", "چکن"],
+    "mutton": ["gosht", "mutun", "muton", "مٹن", "گوشت"],
+    "dumba": ["dhumba", "dhumbuk", "dumbuk", "دنبہ"],
+    "raita": ["raeta", "raitha", "رائتہ"],
+    "lassi": ["lussi", "لسی"],
+    "chai": ["chae", "tea", "چائے"],
+    "rice": ["chawal", "chawel", "چاول"],
+}
+
+VARIANT_TO_CANONICAL = {
+    variant: canonical
+    for canonical, variants in SYNONYMS.items()
+    for variant in [canonical, *variants]
+}
+
+
+def _words(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def normalize(text) -> str:
+    """Lower-case and map every known spelling variant to its canonical form."""
+    return " ".join(VARIANT_TO_CANONICAL.get(w, w) for w in _words(text))
+
+
+def spellings(word):
+    """All known spellings of a word (just the word itself when it has no synonyms)."""
+    canonical = VARIANT_TO_CANONICAL.get(word.lower())
+    if canonical is None:
+        return [word.lower()]
+    return [canonical, *SYNONYMS[canonical]]
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+# ---------------------------
+# Trigram index
+# ---------------------------
+class TrigramIndex:
+    """Inverted index of name trigrams -> document keys, with add/remove for incremental updates."""
+
+    def __init__(self):
+        self._docs = {}
+        self._postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, key, text):
+        self.remove(key)
+        grams = trigrams(text)
+        self._docs[key] = grams
+        for gram in grams:
+            self._postings[gram].add(key)
+
+    def remove(self, key):
+        for gram in self._docs.pop(key, ()):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def search(self, query, limit=20, threshold=0.5):
+        """
+        Return [(score, key)] best first. Score is the share of the query's trigrams found
+        in the document, so a short query still matches a long dish name.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        overlap = defaultdict(int)
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                overlap[key] += 1
+        results = []
+        for key, hits in overlap.items():
+            score = hits / len(grams)
+            if score >= threshold:
+                # tie-break on jaccard so the closest full name wins
+                jaccard = hits / (len(grams) + len(self._docs[key]) - hits)
+                results.append((score, jaccard, key))
+        results.sort(key=lambda r: (-r[0], -r[1], r[2]))
+        return [(score, key) for score, _, key in results[:limit]]
+
+
+class CatalogIndex:
+    """
+    Trigram index over product and category names plus the products themselves, so a
+    lookup needs neither the database nor the cache. Products are filed by category in
+    menu order (id) for category hits.
+    """
+
+    def __init__(self):
+        self.names = TrigramIndex()
+        self.products = {}
+        self.by_category = defaultdict(list)
+
+    def add_product(self, product):
+        self.remove_product(product.id)
+        self.names.add(("product", product.id), product.name)
+        self.products[product.id] = product
+        products = self.by_category[product.category_id]
+        products.append(product)
+        products.sort(key=lambda p: p.id)
+
+    def remove_product(self, product_id):
+        self.names.remove(("product", product_id))
+        old = self.products.pop(product_id, None)
+        if old is not None:
+            self.by_category[old.category_id].remove(old)
+
+    def add_category(self, category):
+        self.names.add(("category", category.id), category.name)
+
+    def remove_category(self, category_id):
+        self.names.remove(("category", category_id))
+
+
+# ---------------------------
+# Per-process catalog index
+# ---------------------------
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def _build_index():
+    index = CatalogIndex()
+    for products in get_menu_snapshot().values():
+        for product in products:
+            index.add_product(product)
+    for category in get_categories():
+        index.add_category(category)
+    return index
+
+
+def get_index():
+    """
+    The worker's catalog index. Built from the cached menu snapshot, so it only reads the
+    cache when the catalog version changed; rebuilt when another worker bumps the catalog.
+    """
+    global _index, _index_version
+    version = get_catalog_version()
+    if _index is None or _index_version != version:
+        index = _build_index()
+        with _lock:
+            _index, _index_version = index, version
+    return _index
+
+
+def _apply(change):
+    """
+    After commit, bump the catalog version and, if this worker's index was current right
+    before the bump, apply the change in place instead of rebuilding on the next query.
+    """
+    def bump_and_apply():
+        global _index_version
+        with _lock:
+            before = get_catalog_version()
+            after = bump_catalog_version()
+            if _index is not None and _index_version == before:
+                change(_index)
+                _index_version = after
+    transaction.on_commit(bump_and_apply)
+
+
+def update_product(product):
+    _apply(lambda index: index.add_product(product))
+
+
+def remove_product(product_id):
+    _apply(lambda index: index.remove_product(product_id))
+
+
+def update_category(category):
+    _apply(lambda index: index.add_category(category))
+
+
+def remove_category(category_id):
+    _apply(lambda index: index.remove_category(category_id))
+
+
+def fuzzy_products(query, branch=None, limit=20):
+    """
+    Typo/transliteration tolerant product lookup served from the in-memory index.
+    A category hit (e.g. "pilau") brings in that category's products after direct name hits.
+    """
+    branch_id = getattr(branch, "pk", branch)
+
+    def visible(product):
+        return product.available and (branch_id is None or product.branch_id in (None, branch_id))
+
+    index = get_index()
+    results, seen = [], set()
+    with _lock:
+        for _, (kind, pk) in index.names.search(query, limit=limit):
+            if kind == "product":
+                found = [index.products[pk]] if pk in index.products else []
+            else:
+                found = index.by_category.get(pk, [])
+            for product in found:
+                if product.id not in seen and visible(product):
+                    seen.add(product.id)
+                    # callers price the results per branch; never mutate the shared instance
+                    results.append(copy.copy(product))
+    return results[:limit]
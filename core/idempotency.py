@@ -0,0 +1,24 @@
+# core/idempotency.py
+import uuid
+
+from django.db import IntegrityError, transaction
+
+from .models import IdempotencyKey
+
+
+def new_key() -> str:
+    """Token rendered into the checkout form; a resubmit of that form carries the same key."""
+    return uuid.uuid4().hex
+
+
+def claim(user, scope, key):
+    """
+    (record, created) for this key. The insert runs in a savepoint, so inside a caller's
+    transaction a concurrent duplicate waits on the unique constraint and then sees the
+    first request's row instead of running the work again.
+    """
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, scope=scope, key=key), True
+    except IntegrityError:
+        return IdempotencyKey.objects.select_related("order").get(user=user, scope=scope, key=key), False
@@ -0,0 +1,115 @@
+# core/images.py
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps
+
+RENDITION_FORMATS = (("webp", "WEBP"), ("jpg", "JPEG"))
+PLACEHOLDER_WIDTH = 16
+
+
+def rendition_widths():
+    return tuple(getattr(settings, "IMAGE_RENDITION_WIDTHS", (60, 120, 180, 360, 720)))
+
+
+def rendition_name(name, width, ext):
+    """products/pizza.jpg -> renditions/products/pizza_360w.webp"""
+    stem, _ = os.path.splitext(name)
+    return f"renditions/{stem}_{width}w.{ext}"
+
+
+def placeholder_name(name):
+    stem, _ = os.path.splitext(name)
+    return f"renditions/{stem}_lqip.jpg"
+
+
+def _save(img, name, fmt, **params):
+    buf = BytesIO()
+    img.save(buf, fmt, **params)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buf.getvalue()))
+
+
+def _has_alpha(img):
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _on_white(img):
+    """JPEG has no alpha: put transparent images on white instead of black."""
+    if img.mode != "RGBA":
+        return img
+    flat = Image.new("RGB", img.size, (255, 255, 255))
+    flat.paste(img, mask=img.getchannel("A"))
+    return flat
+
+
+def generate_derivatives(fieldfile):
+    """
+    Write every width in WebP and JPEG plus a tiny blurred placeholder for an uploaded image
+    (a FieldFile or a storage name).
+    Images narrower than a width are stored at their own size, never upscaled, so every
+    rendition path always exists and templates can build srcset without touching storage.
+    """
+    name = getattr(fieldfile, "name", fieldfile)
+    with default_storage.open(name, "rb") as fh:
+        img = ImageOps.exif_transpose(Image.open(fh))
+        # WebP keeps transparency (PNG/WebP logos); the JPEG fallback is flattened on white
+        img = img.convert("RGBA" if _has_alpha(img) else "RGB")
+
+    for width in rendition_widths():
+        resized = img
+        if img.width > width:
+            resized = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        for ext, fmt in RENDITION_FORMATS:
+            out = _on_white(resized) if fmt == "JPEG" else resized
+            _save(out, rendition_name(name, width, ext), fmt, quality=80, optimize=True)
+
+    tiny = img.resize((PLACEHOLDER_WIDTH, max(1, round(img.height * PLACEHOLDER_WIDTH / img.width))))
+    _save(_on_white(tiny).filter(ImageFilter.GaussianBlur(1)), placeholder_name(name), "JPEG", quality=40)
+    cache.delete(f"img:ready:{name}")
+    cache.delete(f"img:lqip:{name}")
+
+
+def ensure_derivatives(fieldfile):
+    """Generate renditions for a newly uploaded file; a no-op when they already exist."""
+    name = getattr(fieldfile, "name", fieldfile)
+    if not name:
+        return False
+    if default_storage.exists(placeholder_name(name)):
+        return False
+    generate_derivatives(name)
+    return True
+
+
+def derivatives_ready(name) -> bool:
+    key = f"img:ready:{name}"
+    ready = cache.get(key)
+    if ready is None:
+        ready = default_storage.exists(placeholder_name(name))
+        cache.set(key, ready, 60 * 60 * 24)
+    return ready
+
+
+def placeholder_data_uri(name):
+    key = f"img:lqip:{name}"
+    uri = cache.get(key)
+    if uri is None:
+        try:
+            with default_storage.open(placeholder_name(name), "rb") as fh:
+                uri = "data:image/jpeg;base64," + base64.b64encode(fh.read()).decode()
+        except OSError:
+            uri = ""
+        cache.set(key, uri, 60 * 60 * 24)
+    return uri
+
+
+def srcset(name, ext):
+    return ", ".join(
+        f"{default_storage.url(rendition_name(name, w, ext))} {w}w" for w in rendition_widths()
+    )
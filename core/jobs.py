@@ -0,0 +1,138 @@
+# core/jobs.py
+"""
+Small durable job queue on the Job table.
+
+enqueue() inserts the row in the caller's transaction, so a job exists exactly when the
+data it refers to was committed (an order rolled back leaves no loyalty job behind).
+`manage.py run_worker` claims due rows with a visibility timeout and runs the registered
+task; failures are retried with exponential backoff. A task can run more than once (a
+worker may die after the work but before the job is marked done), so tasks must be
+idempotent.
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+DEFAULT_MAX_ATTEMPTS = 5
+VISIBILITY_TIMEOUT = timedelta(minutes=5)
+BACKOFF_BASE = 10        # seconds: 10, 20, 40, 80 ...
+BACKOFF_MAX = 60 * 60
+CLAIM_CANDIDATES = 10
+
+
+class LeaseLost(Exception):
+    """The job's visibility timeout ran out and another worker claimed it."""
+
+
+def task(name):
+    """Register a function as a job task under `name` (see core/tasks.py)."""
+    def register(func):
+        TASKS[name] = func
+        func.task_name = name
+        return func
+    return register
+
+
+def enqueue(task_name, *, delay=None, max_attempts=DEFAULT_MAX_ATTEMPTS, **payload) -> Job:
+    """
+    Queue a call of a registered task with JSON-serializable keyword arguments.
+    `delay` (timedelta) postpones the first run.
+    """
+    task_name = getattr(task_name, "task_name", task_name)
+    if task_name not in TASKS:
+        raise ValueError(f"Unknown task {task_name!r}")
+    job = Job.objects.create(
+        task=task_name,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + (delay or timedelta(0)),
+    )
+    if getattr(settings, "JOBS_RUN_INLINE", False) and not delay:
+        # no worker (dev): run right after the surrounding transaction commits
+        transaction.on_commit(lambda: run_next("inline", job_id=job.pk))
+    return job
+
+
+def _claimable(now):
+    return Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+
+
+def claim(worker, visibility=VISIBILITY_TIMEOUT, job_id=None):
+    """
+    Lease one due job to `worker`, or None. The lease is a conditional UPDATE, so two
+    workers racing for the same row cannot both win (no SKIP LOCKED needed; works on SQLite).
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(_claimable(now))
+    if job_id is not None:
+        candidates = candidates.filter(pk=job_id)
+    for pk in candidates.order_by("run_at", "id").values_list("id", flat=True)[:CLAIM_CANDIDATES]:
+        lease = f"{worker}:{uuid.uuid4().hex[:8]}"
+        won = Job.objects.filter(_claimable(now), pk=pk).update(
+            status=Job.RUNNING,
+            locked_until=now + visibility,
+            locked_by=lease,
+            attempts=F("attempts") + 1,
+        )
+        if won:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def backoff(attempts) -> timedelta:
+    seconds = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=seconds * random.uniform(1, 1.25))  # jitter spreads retries out
+
+
+def run_job(job) -> bool:
+    """
+    Run a claimed job. The task's own writes and the DONE mark commit together; if the
+    lease was lost meanwhile, both roll back and the new owner runs it.
+    """
+    leased = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+    func = TASKS.get(job.task)
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError("Gave up: the job timed out on every attempt")
+        if func is None:
+            raise LookupError(f"Unknown task {job.task!r}")
+        with transaction.atomic():
+            func(**job.payload)
+            if not leased.update(status=Job.DONE, finished_at=timezone.now(), locked_until=None, last_error=""):
+                raise LeaseLost(job.pk)
+    except LeaseLost:
+        logger.warning("Job %s (%s) outlived its visibility timeout; left to the new owner", job.pk, job.task)
+        return False
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        if job.attempts >= job.max_attempts or func is None:
+            leased.update(status=Job.FAILED, finished_at=timezone.now(), locked_until=None, last_error=error)
+            logger.error("Job %s (%s) failed for good:\n%s", job.pk, job.task, error)
+        else:
+            leased.update(
+                status=Job.QUEUED, run_at=timezone.now() + backoff(job.attempts), locked_until=None, last_error=error
+            )
+            logger.warning("Job %s (%s) failed, attempt %s/%s", job.pk, job.task, job.attempts, job.max_attempts)
+        return False
+    return True
+
+
+def run_next(worker, visibility=VISIBILITY_TIMEOUT, job_id=None):
+    """Claim and run one job. None if nothing was due, else whether it succeeded."""
+    job = claim(worker, visibility, job_id=job_id)
+    if job is None:
+        return None
+    return run_job(job)
@@ -1,53 +1,68 @@
 # core/loyalty.py
-from decimal import Decimal, ROUND_DOWN
+from decimal import Decimal
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from .models import UserProfile, PointsTransaction
+from .money import to_paisa, to_rupees
+
+# All amounts below are int paisa (core.money); only the ledger's `amount` column is Rs.
+EARN_RATE_PER_MILLION = int(settings.LOYALTY_EARN_RATE * 1_000_000)  # 0.02 -> 20000
+POINT_VALUE_PAISA = to_paisa(settings.LOYALTY_POINT_VALUE)
+
 
 def get_profile(user):
     profile, _ = UserProfile.objects.get_or_create(user=user)
     return profile
 
-def calc_points_earned(total_amount: Decimal) -> int:
-    if total_amount is None:
+def calc_points_earned(total_paisa: int) -> int:
+    if not total_paisa:
         return 0
-    pts = (total_amount * settings.LOYALTY_EARN_RATE).to_integral_value(rounding=ROUND_DOWN)
-    return int(pts)
+    # EARN_RATE x Rs, rounded down: paisa/100 rupees x rate, kept in ints
+    return max(0, total_paisa * EARN_RATE_PER_MILLION // 100_000_000)
 
-def max_redeemable_points(user, order_total: Decimal) -> int:
+def max_redeemable_points(user, order_total_paisa: int) -> int:
     profile = get_profile(user)
-    # Rs value per point
-    max_by_total = int(order_total / settings.LOYALTY_POINT_VALUE)
+    # paisa value per point
+    max_by_total = order_total_paisa // POINT_VALUE_PAISA
     return max(0, min(profile.points_balance, max_by_total))
 
-def apply_redemption(user, requested_points: int, order_total: Decimal):
-    """Clamp request to allowed range; return (points_to_use, discount_amount)."""
+def apply_redemption(user, requested_points: int, order_total_paisa: int):
+    """Clamp request to allowed range; return (points_to_use, discount_paisa)."""
     requested_points = max(0, int(requested_points or 0))
-    points = min(requested_points, max_redeemable_points(user, order_total))
-    discount = settings.LOYALTY_POINT_VALUE * Decimal(points)
-    return points, discount
+    points = min(requested_points, max_redeemable_points(user, order_total_paisa))
+    return points, points * POINT_VALUE_PAISA
 
-def award_points_for_order(user, order_total: Decimal, order_id: str = "") -> int:
-    """Give points after successful order. Returns points earned."""
-    pts = calc_points_earned(order_total)
+def award_points_for_order(user, order_total_paisa: int, order_id: str = "") -> int:
+    """
+    Give points after successful order. Returns points earned. Runs as a background job
+    (core.tasks) that may be delivered twice: the ledger row goes in first and the
+    unique_order_reward constraint turns a second award for the same order into a no-op.
+    """
+    pts = calc_points_earned(order_total_paisa)
     if pts <= 0:
         return 0
     profile = get_profile(user)
-    profile.points_balance += pts
-    profile.save(update_fields=["points_balance"])
-    PointsTransaction.objects.create(
-        user=user, kind=PointsTransaction.EARN, points=pts,
-        amount=order_total or Decimal("0"), order_id=str(order_id), note="Order reward"
-    )
+    try:
+        with transaction.atomic():
+            PointsTransaction.objects.create(
+                user=user, kind=PointsTransaction.EARN, points=pts,
+                amount=to_rupees(order_total_paisa), order_id=str(order_id), note="Order reward"
+            )
+            UserProfile.objects.filter(pk=profile.pk).update(points_balance=F("points_balance") + pts)
+    except IntegrityError:
+        return 0
     return pts
 
-def redeem_points(user, points_to_use: int, order_total: Decimal, order_id: str = "") -> Decimal:
+def redeem_points(user, points_to_use: int, order_total_paisa: int, order_id: str = "") -> Decimal:
     """Deduct points and create transaction. Returns discount Rs."""
-    points, discount = apply_redemption(user, points_to_use, order_total)
+    points, discount_paisa = apply_redemption(user, points_to_use, order_total_paisa)
     if points <= 0:
-        return Decimal("0")
+        return Decimal("0.00")
     profile = get_profile(user)
     profile.points_balance -= points
     profile.save(update_fields=["points_balance"])
+    discount = to_rupees(discount_paisa)
     PointsTransaction.objects.create(
         user=user, kind=PointsTransaction.REDEEM, points=points,
         amount=discount, order_id=str(order_id), note="Redeemed on order"
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.images import ensure_derivatives, generate_derivatives
+from core.models import Category, Product, Profile
+
+
+class Command(BaseCommand):
+    help = "Generate responsive renditions for images uploaded before renditions existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate even if renditions exist.")
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        sources = [
+            (Product.objects.exclude(image=""), "image"),
+            (Category.objects.exclude(image=""), "image"),
+            (Profile.objects.exclude(profile_picture=""), "profile_picture"),
+        ]
+        for qs, field in sources:
+            for obj in qs.exclude(**{f"{field}__isnull": True}).iterator():
+                fieldfile = getattr(obj, field)
+                try:
+                    if options["force"]:
+                        generate_derivatives(fieldfile)
+                        built += 1
+                    elif ensure_derivatives(fieldfile):
+                        built += 1
+                except (OSError, ValueError) as e:
+                    failed += 1
+                    self.stderr.write(f"{fieldfile.name}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Built renditions for {built} images ({failed} failed)."))
@@ -0,0 +1,146 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from core.menu import bump_catalog_version
+from core.models import CoPurchaseRun, Order, OrderItem, ProductPairCount, ProductRecommendation
+
+# product ids are packed into one int64 key: left * KEY_SHIFT + right
+KEY_SHIFT = np.int64(1 << 31)
+
+
+def count_pairs(order_ids, product_ids):
+    """
+    Vectorised co-occurrence count over (order_id, product_id) lines.
+    Returns (keys, counts): keys pack (product, other) and each pair appears in both directions.
+    """
+    if len(order_ids) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # one row per (order, product), sorted by order
+    lines = np.unique(np.stack([order_ids, product_ids], axis=1), axis=0)
+    orders, products = lines[:, 0], lines[:, 1]
+
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(orders)])
+    group = np.repeat(np.arange(len(starts)), sizes)
+
+    # pair every line with every line of its own order
+    partners = sizes[group]
+    left = np.repeat(products, partners)
+    offset = np.arange(partners.sum()) - np.repeat(np.cumsum(partners) - partners, partners)
+    right = products[np.repeat(starts[group], partners) + offset]
+
+    keep = left != right
+    keys = left[keep] * KEY_SHIFT + right[keep]
+    return np.unique(keys, return_counts=True)
+
+
+def merge_counts(keys, counts):
+    """Sum counts of equal keys."""
+    if len(keys) == 0:
+        return keys, counts
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    return uniq, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def top_k(keys, counts, k):
+    """[(product, other, rank, count)] keeping the k most co-purchased partners per product."""
+    left, right = keys // KEY_SHIFT, keys % KEY_SHIFT
+    order = np.lexsort((right, -counts, left))
+    left, right, counts = left[order], right[order], counts[order]
+    starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+    sizes = np.diff(np.r_[starts, len(left)])
+    rank = np.arange(len(left)) - np.repeat(starts, sizes)
+    keep = rank < k
+    return zip(left[keep].tolist(), right[keep].tolist(), (rank[keep] + 1).tolist(), counts[keep].tolist())
+
+
+class Command(BaseCommand):
+    help = "Build 'frequently bought together' recommendations from OrderItem co-purchases."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recount all orders instead of only new ones.")
+        parser.add_argument("--top-k", type=int, default=4, help="Neighbours to keep per product (default 4).")
+        parser.add_argument("--batch-orders", type=int, default=100_000,
+                            help="Orders read per batch; bounds memory on large histories.")
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        last_run = CoPurchaseRun.objects.order_by("-id").first()
+        since = 0 if full or last_run is None else last_run.last_order_id
+        upto = Order.objects.aggregate(m=Max("id"))["m"] or 0
+        if upto <= since and not full:
+            self.stdout.write("No new orders since the last run.")
+            return
+
+        lines = (
+            OrderItem.objects.filter(product__isnull=False)
+            .exclude(order__status="cancelled")
+            .values_list("order_id", "product_id")
+        )
+
+        all_keys, all_counts, processed = [], [], 0
+        for start in range(since, upto, options["batch_orders"]):
+            end = min(start + options["batch_orders"], upto)
+            batch = np.array(list(lines.filter(order_id__gt=start, order_id__lte=end)), dtype=np.int64)
+            if not len(batch):
+                continue
+            processed += len(batch)
+            keys, counts = count_pairs(batch[:, 0], batch[:, 1])
+            all_keys.append(keys)
+            all_counts.append(counts)
+            # fold batches as we go so memory stays bounded by distinct pairs, not lines
+            if len(all_keys) > 1:
+                merged = merge_counts(np.concatenate(all_keys), np.concatenate(all_counts))
+                all_keys, all_counts = [merged[0]], [merged[1]]
+
+        new_keys = np.concatenate(all_keys) if all_keys else np.empty(0, dtype=np.int64)
+        new_counts = np.concatenate(all_counts) if all_counts else np.empty(0, dtype=np.int64)
+        affected = np.unique(new_keys // KEY_SHIFT).tolist()
+
+        with transaction.atomic():
+            if full:
+                ProductPairCount.objects.all().delete()
+                ProductRecommendation.objects.all().delete()
+                keys, counts = new_keys, new_counts
+            else:
+                # add the new counts onto what earlier runs stored for the affected products
+                existing = np.array(
+                    list(ProductPairCount.objects.filter(product_id__in=affected)
+                         .values_list("product_id", "other_id", "count")),
+                    dtype=np.int64,
+                ).reshape(-1, 3)
+                keys, counts = merge_counts(
+                    np.concatenate([new_keys, existing[:, 0] * KEY_SHIFT + existing[:, 1]]),
+                    np.concatenate([new_counts, existing[:, 2]]),
+                )
+
+            ProductPairCount.objects.bulk_create(
+                [
+                    ProductPairCount(product_id=int(key // KEY_SHIFT), other_id=int(key % KEY_SHIFT), count=int(count))
+                    for key, count in zip(keys.tolist(), counts.tolist())
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=["product", "other"],
+                update_fields=["count"],
+            )
+
+            ProductRecommendation.objects.filter(product_id__in=affected).delete()
+            ProductRecommendation.objects.bulk_create(
+                [
+                    ProductRecommendation(product_id=p, recommended_id=o, rank=r, count=c)
+                    for p, o, r, c in top_k(keys, counts, options["top_k"])
+                ],
+                batch_size=1000,
+            )
+            CoPurchaseRun.objects.create(last_order_id=upto, lines_processed=processed, full_rebuild=full)
+            # product pages show the recommendations; their ETags follow the catalog version
+            transaction.on_commit(bump_catalog_version)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} order lines up to order #{upto}; "
+            f"updated recommendations for {len(affected)} products."
+        ))
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from core.images import placeholder_name, rendition_name, rendition_widths, RENDITION_FORMATS
+from core.menu import bump_catalog_version
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+RENDITIONS_PREFIX = "renditions/"  # core.images output; follows its original, never deduped/recompressed
+
+
+# ---------------- worker functions (run in the process pool) ----------------
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return path, digest.hexdigest(), os.path.getsize(path)
+
+
+def recompress_file(args):
+    """Re-encode one image in place; keep the result only if it is at least `min_saving` smaller."""
+    path, dry_run, min_saving = args
+    from PIL import Image
+
+    ext = os.path.splitext(path)[1].lower()
+    before = os.path.getsize(path)
+    try:
+        with Image.open(path) as img:
+            img.load()
+            fmt = img.format
+            params = {"optimize": True}
+            # keep the orientation tag (phone photos) and the colour profile
+            if img.info.get("exif"):
+                params["exif"] = img.info["exif"]
+            if img.info.get("icc_profile"):
+                params["icc_profile"] = img.info["icc_profile"]
+            if fmt == "JPEG":
+                params.update(quality=85, progressive=True)
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                    params.pop("icc_profile", None)  # it described the old (e.g. CMYK) pixels
+            elif fmt == "WEBP":
+                params.update(quality=80, method=6)
+            elif fmt != "PNG":
+                return path, before, before, "skipped"
+            fd, tmp = tempfile.mkstemp(suffix=ext, dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as out:
+                img.save(out, fmt, **params)
+    except OSError as e:
+        return path, before, before, f"error: {e}"
+
+    after = os.path.getsize(tmp)
+    worth_it = after <= before * (1 - min_saving)
+    if dry_run or not worth_it:
+        os.remove(tmp)
+    else:
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    return path, before, after if worth_it else before, "recompressed" if worth_it else "kept"
+
+
+# ---------------- command ----------------
+class Command(BaseCommand):
+    help = (
+        "Hash every media file in parallel, merge byte-identical duplicates, delete files no "
+        "FileField/ImageField references and recompress the remaining images."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would change.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+        parser.add_argument("--no-recompress", action="store_true", help="Skip the recompression pass.")
+        parser.add_argument("--min-saving", type=float, default=0.05,
+                            help="Keep a recompressed file only if it is this much smaller (default 5%%).")
+        parser.add_argument("--min-age", type=int, default=60,
+                            help="Never delete files modified in the last N minutes (uploads in flight).")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, FileSystemStorage):
+            raise CommandError("optimize_media only works with local FileSystemStorage.")
+        self.root = os.path.abspath(settings.MEDIA_ROOT)
+        self.dry_run = options["dry_run"]
+        workers = max(1, options["workers"])
+        cutoff = time.time() - options["min_age"] * 60
+        prefix = "[dry-run] " if self.dry_run else ""
+
+        files = list(self._walk())
+        originals = [f for f in files if not f.startswith(RENDITIONS_PREFIX)]
+        renditions = [f for f in files if f.startswith(RENDITIONS_PREFIX)]
+        refs = self._references()
+        self.stdout.write(f"{len(files)} media files ({len(renditions)} renditions), {len(refs)} referenced names.")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            hashed = list(pool.map(hash_file, (os.path.join(self.root, f) for f in originals), chunksize=64))
+
+        # ---- duplicates: same bytes under several names -> keep one, repoint rows ----
+        by_hash = defaultdict(list)
+        for path, digest, size in hashed:
+            by_hash[digest].append((os.path.relpath(path, self.root).replace(os.sep, "/"), size))
+
+        removed, reclaimed, repointed, moved = set(), 0, 0, set()
+        for group in by_hash.values():
+            if len(group) < 2:
+                continue
+            names = sorted(n for n, _ in group)
+            if not any(n in refs for n in names):
+                continue  # no copy is used: the orphan pass collects every one of them
+            # prefer a referenced name, then the shortest (Django's un-suffixed original)
+            keep = min(names, key=lambda n: (n not in refs, len(n), n))
+            for name, size in group:
+                if name == keep:
+                    continue
+                self.stdout.write(f"{prefix}duplicate {name} -> {keep}")
+                if name in refs:
+                    repointed += self._repoint(name, keep)
+                    moved.update((name, keep))
+                removed.add(name)
+                reclaimed += size
+                refs.discard(name)
+                refs.add(keep)
+
+        # ---- orphans: nothing references them (renditions follow their original) ----
+        keep_renditions = {
+            rendition_name(name, w, ext) for name in refs for w in rendition_widths() for ext, _ in RENDITION_FORMATS
+        } | {placeholder_name(name) for name in refs}
+        orphans = 0
+        candidates = [(os.path.relpath(path, self.root).replace(os.sep, "/"), path, size) for path, _, size in hashed]
+        candidates += [(name, os.path.join(self.root, name), None) for name in renditions]
+        for name, path, size in candidates:
+            if name in removed or name in refs or name in keep_renditions:
+                continue
+            if os.path.getmtime(path) > cutoff:
+                continue
+            self.stdout.write(f"{prefix}orphan {name}")
+            removed.add(name)
+            reclaimed += size if size is not None else os.path.getsize(path)
+            orphans += 1
+
+        if not self.dry_run:
+            for name in removed:
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    pass
+            if repointed:
+                # templates cached "renditions ready" for the old and the kept name
+                cache.delete_many([f"img:{kind}:{name}" for name in moved for kind in ("ready", "lqip")])
+                bump_catalog_version()
+
+        # ---- recompress what is left (originals only; renditions are already tuned) ----
+        saved = 0
+        if not options["no_recompress"]:
+            targets = [
+                (os.path.join(self.root, name), self.dry_run, options["min_saving"])
+                for name in sorted(refs)
+                if name not in removed
+                and not name.startswith(RENDITIONS_PREFIX)
+                and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+                and os.path.exists(os.path.join(self.root, name))
+            ]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for path, before, after, status in pool.map(recompress_file, targets, chunksize=16):
+                    if status.startswith("error"):
+                        self.stderr.write(f"{os.path.relpath(path, self.root)}: {status}")
+                    elif after < before:
+                        saved += before - after
+                        self.stdout.write(
+                            f"{prefix}recompress {os.path.relpath(path, self.root)}: {before} -> {after} bytes"
+                        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{len(removed) - orphans} duplicates ({repointed} rows repointed), {orphans} orphans, "
+            f"{reclaimed + saved} bytes reclaimed."
+        ))
+
+    def _walk(self):
+        """Relative paths of every file under MEDIA_ROOT."""
+        stack = [self.root]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+
+    def _file_fields(self):
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField):
+                    yield model, field.name
+
+    def _references(self):
+        refs = set()
+        for model, field in self._file_fields():
+            refs.update(
+                n for n in model._default_manager.exclude(**{field: ""})
+                .values_list(field, flat=True).iterator(chunk_size=2000) if n
+            )
+        return refs
+
+    def _repoint(self, old, new):
+        if self.dry_run:
+            return sum(m._default_manager.filter(**{f: old}).count() for m, f in self._file_fields())
+        count = 0
+        with transaction.atomic():
+            for model, field in self._file_fields():
+                count += model._default_manager.filter(**{field: old}).update(**{field: new})
+        return count
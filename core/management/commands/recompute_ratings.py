@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.menu import bump_catalog_version
+from core.ratings import recompute_rating_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the denormalized rating stats on Product from the Review table "
+        "(repair tool; reviews normally update the stats incrementally)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_ids", nargs="*", type=int, help="Only these products (default: all).")
+
+    def handle(self, *args, **options):
+        recompute_rating_stats(options["product_ids"] or None)
+        bump_catalog_version()
+        scope = f"{len(options['product_ids'])} product(s)" if options["product_ids"] else "all products"
+        self.stdout.write(self.style.SUCCESS(f"Rating stats rebuilt for {scope}."))
@@ -0,0 +1,76 @@
+import logging
+import os
+import signal
+import socket
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core import jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the Job table (core.jobs): emails, loyalty awards. "
+        "Each thread leases one job at a time; failed jobs are retried with backoff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Worker threads (default 2).")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument(
+            "--visibility-timeout", type=int, default=int(jobs.VISIBILITY_TIMEOUT.total_seconds()),
+            help="Seconds a leased job stays invisible to other workers before it is retried.",
+        )
+        parser.add_argument("--once", action="store_true", help="Exit when no job is due instead of polling.")
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self.stop.set())
+
+        visibility = timedelta(seconds=options["visibility_timeout"])
+        name = f"{socket.gethostname()}:{os.getpid()}"
+        self.counts = {"done": 0, "failed": 0}
+        self.lock = threading.Lock()
+        threads = [
+            threading.Thread(
+                target=self.work, args=(f"{name}:{n}", visibility, options["poll"], options["once"]), daemon=True
+            )
+            for n in range(max(1, options["concurrency"]))
+        ]
+        self.stdout.write(f"Worker {name} started with {len(threads)} thread(s).")
+        for thread in threads:
+            thread.start()
+        # join with a timeout so Ctrl+C reaches the signal handler
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(0.5)
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker stopped: {self.counts['done']} job(s) done, {self.counts['failed']} failed."
+        ))
+
+    def work(self, worker, visibility, poll, once):
+        try:
+            while not self.stop.is_set():
+                try:
+                    result = jobs.run_next(worker, visibility)
+                except Exception:
+                    # e.g. "database is locked" or a dropped connection: keep the thread alive
+                    logger.exception("Worker %s could not claim/run a job; retrying", worker)
+                    close_old_connections()
+                    self.stop.wait(poll)
+                    continue
+                if result is None:
+                    if once:
+                        return
+                    self.stop.wait(poll)
+                    continue
+                with self.lock:
+                    self.counts["done" if result else "failed"] += 1
+        finally:
+            connection.close()  # each thread has its own connection
@@ -0,0 +1,86 @@
+# core/menu.py
+import time
+from django.core.cache import cache
+from django.db.models import Q
+from .models import Category, Product
+
+# Catalog cache keys include this version; any Product/Category/Branch change bumps it
+# (see core/signals.py), so stale entries are simply never read again.
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def branch_products(branch=None):
+    """
+    Products visible for a branch: shared products (no branch) plus the branch's own.
+    With no branch selected every product is visible.
+    """
+    qs = Product.objects.all()
+    if branch:
+        qs = qs.filter(Q(branch__isnull=True) | Q(branch=branch))
+    return qs
+
+
+def build_menu_snapshot(branch=None):
+    """
+    Build the whole menu as {category: [products]} with a single query, each product
+    priced for the branch. Categories without any visible product are left out.
+    """
+    from .pricing import price_products  # pricing builds on the catalog cache keys below
+    qs = branch_products(branch).select_related('category').order_by('category_id', 'id')
+    snapshot = {}
+    for product in price_products(list(qs), branch):
+        snapshot.setdefault(product.category, []).append(product)
+    return snapshot
+
+
+def featured_from_snapshot(snapshot, limit=8):
+    """Pick featured products out of an already built snapshot (no extra query)."""
+    featured = [p for products in snapshot.values() for p in products if p.is_featured]
+    featured.sort(key=lambda p: p.id)
+    return featured[:limit]
+
+
+# ---------------------------
+# Versioned catalog cache
+# ---------------------------
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # a timestamp token, like bump_catalog_version, so a lost key never reuses an old version
+        version = time.time_ns()
+        if not cache.add(CATALOG_VERSION_KEY, version, None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version() -> int:
+    # a fresh token, not incr(): FileBasedCache.incr is get+set, so two processes bumping
+    # at once could both land on the same number and keep serving the stale menu
+    version = time.time_ns()
+    cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+def _catalog_key(*parts):
+    return ":".join(["catalog", str(get_catalog_version())] + [str(p) for p in parts])
+
+
+def get_menu_snapshot(branch=None):
+    """Cached build_menu_snapshot(), shared by all workers until the catalog version changes."""
+    key = _catalog_key("menu", branch.id if branch else "all")
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_menu_snapshot(branch)
+        cache.set(key, snapshot, CATALOG_CACHE_TIMEOUT)
+    return snapshot
+
+
+def get_categories():
+    """Cached list of all categories."""
+    key = _catalog_key("categories")
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.all())
+        cache.set(key, categories, CATALOG_CACHE_TIMEOUT)
+    return categories
@@ -0,0 +1,107 @@
+# core/middleware.py
+import hashlib
+import re
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.translation import get_language
+
+from .cart import get_guest_cart
+from .menu import _catalog_key
+
+# Anonymous menu pages served from the page cache
+PAGE_CACHE_URL_NAMES = {'home', 'full_menu', 'categories', 'products', 'products_by_category'}
+
+# Every visitor needs their own CSRF token, so cached HTML stores a placeholder instead
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = b'__CSRF_TOKEN__'
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Full-page cache for anonymous GETs of the menu pages.
+
+    Keys include the path, query string, language and the session's selected branch,
+    and live under the catalog version, so a product/category/branch edit makes every
+    cached page stale at once. Logged-in users and requests with pending messages
+    always get a fresh render.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 10)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, '_page_cache_key', None)
+        if key and request.method == 'GET' and self._storable(request, response):
+            content = CSRF_INPUT_RE.sub(rb'\1' + CSRF_PLACEHOLDER + rb'\2', response.content)
+            cache.set(key, (content, response['Content-Type'], response.get('ETag')), self.timeout)
+            response['X-Page-Cache'] = 'miss'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return None
+        if request.resolver_match.url_name not in PAGE_CACHE_URL_NAMES:
+            return None
+        if len(get_messages(request)):
+            return None
+
+        key = self._key(request)
+        cached = cache.get(key)
+        if cached is None:
+            request._page_cache_key = key
+            return None
+
+        content, content_type, etag = cached
+        if etag:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+        if CSRF_PLACEHOLDER in content:
+            content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+        response = HttpResponse(content, content_type=content_type)
+        if etag:
+            response['ETag'] = etag
+        response['X-Page-Cache'] = 'hit'
+        return response
+
+    def _key(self, request):
+        raw = "|".join([
+            request.get_host(),
+            request.path,
+            request.GET.urlencode(),
+            get_language() or '',
+            str(request.session.get('selected_branch_id') or ''),
+            # navbar shows the guest cart badge
+            str(get_guest_cart(request).count),
+        ])
+        return _catalog_key("page", hashlib.md5(raw.encode()).hexdigest())
+
+    def _storable(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.session.modified
+            and not len(get_messages(request))
+        )
+
+
+class GuestCartMiddleware:
+    """Writes the signed guest cart cookie back when a view changed the cart."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cart = getattr(request, '_guest_cart', None)
+        if cart is not None:
+            cart.save(response)
+        return response
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-15 02:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    Review = apps.get_model('core', 'Review')
+    mean = float(getattr(settings, 'RATING_PRIOR_MEAN', 3.5))
+    weight = float(getattr(settings, 'RATING_PRIOR_WEIGHT', 5))
+    stats = {}
+    for product_id, rating in Review.objects.values_list('product_id', 'rating'):
+        s = stats.setdefault(product_id, {'rating_count': 0, 'rating_sum': 0})
+        bucket = 'rating_%d_count' % min(max(int(rating), 1), 5)
+        s['rating_count'] += 1
+        s['rating_sum'] += int(rating)
+        s[bucket] = s.get(bucket, 0) + 1
+    for product_id, s in stats.items():
+        s['rating_score'] = (mean * weight + s['rating_sum']) / (weight + s['rating_count'])
+        Product.objects.filter(pk=product_id).update(**s)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_score', 'id'], name='product_rating_score_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-15 02:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """Fold duplicate (cart, product) lines into the oldest one before the unique constraint."""
+    CartItem = apps.get_model('core', 'CartItem')
+    dupes = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(n=models.Count('id'), qty=models.Sum('quantity'), keep=models.Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in dupes:
+        CartItem.objects.filter(id=row['keep']).update(quantity=row['qty'])
+        CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_order_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointstransaction',
+            index=models.Index(fields=['user', '-created_at'], name='points_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'branch', 'available'], name='product_cat_branch_avail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_featured'], name='product_featured_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
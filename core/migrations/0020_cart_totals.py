@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-15 02:30
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('core', 'Cart')
+    CartItem = apps.get_model('core', 'CartItem')
+    totals = {}
+    lines = CartItem.objects.values_list('cart_id', 'quantity', 'product__price', 'product__discount_price')
+    for cart_id, quantity, price, discount_price in lines.iterator():
+        final = discount_price if discount_price is not None else price
+        paisa = int((Decimal(final) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+        count, total = totals.get(cart_id, (0, 0))
+        totals[cart_id] = (count + quantity, total + paisa * quantity)
+    for cart_id, (count, total) in totals.items():
+        Cart.objects.filter(pk=cart_id).update(item_count=count, total_paisa=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_paisa',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
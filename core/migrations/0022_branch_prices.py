@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-15 02:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.branch'),
+        ),
+        migrations.CreateModel(
+            name='BranchPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='core.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='branch_prices', to='core.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('branch', 'product'), name='unique_branch_price')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-15 02:37
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+def total_price_to_paisa(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    orders = list(Order.objects.only('id', 'total_price'))
+    for order in orders:
+        order.total_paisa = int((order.total_price * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    Order.objects.bulk_update(orders, ['total_paisa'], batch_size=500)
+
+
+def paisa_to_total_price(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    orders = list(Order.objects.only('id', 'total_paisa'))
+    for order in orders:
+        order.total_price = Decimal(order.total_paisa).scaleb(-2)
+    Order.objects.bulk_update(orders, ['total_price'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_branch_prices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_paisa',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(total_price_to_paisa, paisa_to_total_price),
+        migrations.RemoveField(
+            model_name='order',
+            name='total_price',
+        ),
+    ]
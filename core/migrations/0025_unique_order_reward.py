@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-15 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def drop_duplicate_rewards(apps, schema_editor):
+    """Orders rewarded twice: keep the first ledger row and take the extra points back."""
+    PointsTransaction = apps.get_model('core', 'PointsTransaction')
+    UserProfile = apps.get_model('core', 'UserProfile')
+    rewards = PointsTransaction.objects.filter(kind='EARN').exclude(order_id='')
+    dupes = rewards.values('order_id').annotate(n=Count('id')).filter(n__gt=1).values_list('order_id', flat=True)
+    for order_id in dupes:
+        first, *extra = rewards.filter(order_id=order_id).order_by('id')
+        for row in extra:
+            UserProfile.objects.filter(user_id=row.user_id).update(points_balance=F('points_balance') - row.points)
+            row.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_rewards, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pointstransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'EARN'), models.Q(('order_id', ''), _negated=True)), fields=('order_id', 'kind'), name='unique_order_reward'),
+        ),
+    ]
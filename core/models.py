@@ -1,10 +1,12 @@
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from django.db import models
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from .money import to_paisa, to_rupees
 
 User = get_user_model()
 
@@ -52,18 +54,79 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_featured = models.BooleanField(default=False)
 
+    # Denormalized review stats, maintained by core.ratings on Review create/delete
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    rating_score = models.FloatField(default=0)  # Bayesian-adjusted average, used for sorting
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_score', 'id'], name='product_rating_score_idx'),
+            # menu/category listings: category + branch visibility + available filter
+            models.Index(fields=['category', 'branch', 'available'], name='product_cat_branch_avail_idx'),
+            # home page featured strip
+            models.Index(fields=['is_featured'], name='product_featured_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @property
+    def rating_average(self) -> float:
+        return round(self.rating_sum / self.rating_count, 1) if self.rating_count else 0
+
+    @property
+    def rating_histogram(self):
+        """[(stars, count, percent)] from 5 stars down to 1."""
+        rows = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f'rating_{stars}_count')
+            percent = round(100 * count / self.rating_count) if self.rating_count else 0
+            rows.append((stars, count, percent))
+        return rows
+
+    @property
+    def quote(self):
+        """
+        pricing.Quote (regular, unit) for this product. Listings, carts and checkout set it
+        in one pass with the branch price table (core.pricing); otherwise the base price.
+        """
+        quote = self.__dict__.get('_quote')
+        if quote is None:
+            from .pricing import quote_product
+            quote = quote_product(self)
+        return quote
+
     def get_final_price(self) -> Decimal:
         """
         Return the price the customer should pay (discount_price if present, else regular price).
-        Ensures a Decimal is always returned.
+        Ensures a Decimal is always returned; sums should use quote.unit_paisa instead.
         """
-        final = self.discount_price if self.discount_price is not None else self.price
-        if not isinstance(final, Decimal):
-            final = Decimal(final)
-        return final.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        return self.quote.unit
+
+
+# ============================
+#     Branch Price
+# ============================
+class BranchPrice(models.Model):
+    """Per-branch override of a product's price, read by core.pricing."""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="prices")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="branch_prices")
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["branch", "product"], name="unique_branch_price"),
+        ]
+
+    def __str__(self):
+        return f"{self.product} @ {self.branch}: {self.price}"
 
 
 # ============================
@@ -73,6 +136,11 @@ class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="cart")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized totals, maintained by core.cart in the same transaction as each line change
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")  # totals priced for
+    item_count = models.PositiveIntegerField(default=0)
+    total_paisa = models.BigIntegerField(default=0)  # sum of final price x quantity, in paisa
+
     def __str__(self):
         return f"Cart for {self.user.username if self.user else 'Guest'}"
 
@@ -82,17 +150,11 @@ class Cart(models.Model):
 
     @property
     def total_items(self) -> int:
-        return sum(item.quantity for item in self.items.all())
+        return self.item_count
 
     @property
     def total_price(self) -> Decimal:
-        total = Decimal('0.00')
-        for item in self.items.all():
-            tp = item.total_price()
-            if not isinstance(tp, Decimal):
-                tp = Decimal(tp)
-            total += tp
-        return total.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        return to_rupees(self.total_paisa)
 
 
 # ============================
@@ -104,13 +166,17 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # one line per product; adding again bumps quantity
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
     def total_price(self) -> Decimal:
-        price = self.product.get_final_price()
-        total = price * Decimal(self.quantity)
-        return total.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        return to_rupees(self.product.quote.unit_paisa * self.quantity)
 
 
 # ============================
@@ -129,16 +195,27 @@ class Order(models.Model):
     phone = models.CharField(max_length=20)
     address = models.TextField()
     branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
-    total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_paisa = models.BigIntegerField(default=0)  # order total in paisa (see core.money)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Last-Modified for order pages
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # my_orders (per user, newest first)
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            # admin lists / dashboard filtered by status
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
+    @property
+    def total_price(self) -> Decimal:
+        return to_rupees(self.total_paisa)
+
 
 # ============================
 #         OrderItem
@@ -153,6 +230,10 @@ class OrderItem(models.Model):
         product_name = self.product.name if self.product else 'Deleted Product'
         return f"{self.quantity} x {product_name}"
 
+    @property
+    def subtotal(self) -> Decimal:
+        return to_rupees(to_paisa(self.price) * self.quantity)
+
 
 # ============================
 #         Review
@@ -160,7 +241,7 @@ class OrderItem(models.Model):
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    rating = models.IntegerField()
+    rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -241,11 +322,133 @@ class PointsTransaction(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # loyalty dashboard history
+            models.Index(fields=["user", "-created_at"], name="points_user_created_idx"),
+        ]
+        constraints = [
+            # one reward per order, even if the award job runs twice
+            models.UniqueConstraint(
+                fields=["order_id", "kind"],
+                condition=models.Q(kind="EARN") & ~models.Q(order_id=""),
+                name="unique_order_reward",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} {self.kind} {self.points} pts"
 
 
+# ============================
+#     Idempotency Keys
+# ============================
+class IdempotencyKey(models.Model):
+    """
+    One row per checkout/payment attempt (core.idempotency). A replayed request finds
+    the row through the unique constraint and gets the original result back.
+    """
+    CHECKOUT = "checkout"
+    PAYMENT = "payment"
+    SCOPE_CHOICES = [(CHECKOUT, "Checkout"), (PAYMENT, "Payment session")]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="idempotency_keys")
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    key = models.CharField(max_length=64)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    response = models.JSONField(default=dict, blank=True)  # e.g. Stripe session id/url
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "scope", "key"], name="unique_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+
+# ============================
+#  Co-purchase Recommendations
+# ============================
+class ProductPairCount(models.Model):
+    """How many orders contained both products (symmetric; built by `manage.py build_recommendations`)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "other"], name="unique_product_pair"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.count}"
+
+
+class ProductRecommendation(models.Model):
+    """Top-K 'frequently bought together' neighbours per product, read by product_detail."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="recommendations")
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["product", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="unique_product_recommendation_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.product} -> {self.recommended} (#{self.rank})"
+
+
+class CoPurchaseRun(models.Model):
+    """One build_recommendations run; last_order_id is the watermark for incremental runs."""
+    last_order_id = models.PositiveBigIntegerField(default=0)
+    lines_processed = models.PositiveIntegerField(default=0)
+    full_rebuild = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Co-purchase run up to order #{self.last_order_id}"
+
+
+# ============================
+#     Background Jobs
+# ============================
+class Job(models.Model):
+    """
+    One queued call of a core.jobs task, run by `manage.py run_worker`. A running job
+    whose locked_until has passed (worker died) becomes claimable again.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)  # not before (retry backoff)
+    locked_until = models.DateTimeField(null=True, blank=True)  # visibility timeout
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # worker poll: due jobs oldest first
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+
 # ============================
 # Signals: auto-create Profile & Cart for new users
 # ============================
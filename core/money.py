@@ -0,0 +1,21 @@
+# core/money.py
+"""
+Money is carried as an int number of paisa (1 Rs = 100 paisa) everywhere it is added
+up or stored as a total: cart lines, cart/order totals, loyalty maths, reports.
+Decimal only appears at the edges: reading DecimalField prices, templates and JSON.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+PAISA_PER_RUPEE = 100
+
+
+def to_paisa(amount) -> int:
+    """Rs (Decimal/str/int) -> int paisa, rounded half up. None counts as 0."""
+    if amount is None:
+        return 0
+    return int((Decimal(amount) * PAISA_PER_RUPEE).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_rupees(paisa) -> Decimal:
+    """int paisa -> Rs Decimal with two places (exact, no rounding needed)."""
+    return Decimal(int(paisa or 0)).scaleb(-2)
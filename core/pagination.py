@@ -0,0 +1,135 @@
+# core/pagination.py
+import base64
+import json
+from operator import attrgetter
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+
+PAGE_SIZE = 25
+
+
+def _fields(ordering):
+    """('-created_at', '-id') -> [('created_at', True), ('id', True)]"""
+    return [(o.lstrip('-'), o.startswith('-')) for o in ordering]
+
+
+def _json_default(value):
+    # full isoformat: DjangoJSONEncoder drops microseconds, which would break created_at ties
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode(values):
+    raw = json.dumps(values, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode(token, model, fields):
+    """Turn a cursor token back into typed field values; None if missing or tampered."""
+    if not token or model is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [model._meta.get_field(name).to_python(v) for v, (name, _) in zip(values, fields)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _seek_q(fields, cursor, forward):
+    """Rows strictly after (forward) or before the cursor in the given ordering."""
+    q = Q()
+    for i, (name, desc) in enumerate(fields):
+        op = 'lt' if desc == forward else 'gt'
+        clause = {fields[j][0]: cursor[j] for j in range(i)}
+        clause[f'{name}__{op}'] = cursor[i]
+        q |= Q(**clause)
+    return q
+
+
+def _is_beyond(obj, fields, cursor, forward):
+    for (name, desc), c in zip(fields, cursor):
+        v = getattr(obj, name)
+        if v != c:
+            return v < c if desc == forward else v > c
+    return False
+
+
+def _sorted(items, fields, forward):
+    items = list(items)
+    for name, desc in reversed(fields):
+        items.sort(key=attrgetter(name), reverse=desc == forward)
+    return items
+
+
+class KeysetPage:
+    """One page of a keyset (seek) paginated listing, with cursor links for the template."""
+
+    def __init__(self, items, fields, request, has_next, has_previous):
+        self.items = items
+        self.fields = fields
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._request = request
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _url(self, obj, direction):
+        params = self._request.GET.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[direction] = _encode([getattr(obj, name) for name, _ in self.fields])
+        return '?' + params.urlencode()
+
+    @property
+    def next_url(self):
+        return self._url(self.items[-1], 'after') if self.has_next and self.items else None
+
+    @property
+    def previous_url(self):
+        return self._url(self.items[0], 'before') if self.has_previous and self.items else None
+
+
+def keyset_paginate(request, source, ordering, per_page=PAGE_SIZE):
+    """
+    Seek pagination over a queryset (or an in-memory list, e.g. the cached menu) ordered by
+    `ordering`, which must end in a unique field such as 'id'. The page is read with a
+    WHERE on the last seen key instead of OFFSET, so page N costs the same as page 1.
+    Cursors come from ?after= / ?before=.
+    """
+    fields = _fields(ordering)
+    if isinstance(source, QuerySet):
+        model = source.model
+    else:
+        model = type(source[0]) if source else None
+
+    before = _decode(request.GET.get('before'), model, fields)
+    after = None if before else _decode(request.GET.get('after'), model, fields)
+    cursor, forward = (before, False) if before else (after, True)
+
+    if isinstance(source, QuerySet):
+        flipped = ordering if forward else [o[1:] if o.startswith('-') else f'-{o}' for o in ordering]
+        qs = source.order_by(*flipped)
+        if cursor:
+            qs = qs.filter(_seek_q(fields, cursor, forward))
+        rows = list(qs[:per_page + 1])
+    else:
+        rows = _sorted(source, fields, forward)
+        if cursor:
+            rows = [obj for obj in rows if _is_beyond(obj, fields, cursor, forward)]
+        rows = rows[:per_page + 1]
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+    if forward:
+        return KeysetPage(rows, fields, request, has_next=has_more, has_previous=cursor is not None)
+    return KeysetPage(rows, fields, request, has_next=True, has_previous=has_more)
@@ -0,0 +1,83 @@
+# core/pricing.py
+"""
+One place that decides what a product costs. Prices a whole list of products or cart
+lines in one pass: base price/discount from the product row, overridden by the branch
+price table (BranchPrice) when the branch has its own price.
+"""
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.core.cache import cache
+
+from .menu import CATALOG_CACHE_TIMEOUT, _catalog_key
+from .models import BranchPrice
+from .money import to_paisa, to_rupees
+
+
+class Quote(NamedTuple):
+    regular_paisa: int  # list price
+    unit_paisa: int     # what the customer pays (discount when there is one)
+
+    @property
+    def discounted(self) -> bool:
+        return self.unit_paisa < self.regular_paisa
+
+    # Rs for templates / JSON
+    @property
+    def regular(self) -> Decimal:
+        return to_rupees(self.regular_paisa)
+
+    @property
+    def unit(self) -> Decimal:
+        return to_rupees(self.unit_paisa)
+
+
+def _quote(price, discount_price) -> Quote:
+    regular = to_paisa(price)
+    return Quote(regular, to_paisa(discount_price) if discount_price is not None else regular)
+
+
+def branch_price_table(branch_id):
+    """{product_id: Quote} overrides for a branch, cached until the catalog version changes."""
+    if not branch_id:
+        return {}
+    key = _catalog_key("prices", branch_id)
+    table = cache.get(key)
+    if table is None:
+        table = {
+            product_id: _quote(price, discount_price)
+            for product_id, price, discount_price in
+            BranchPrice.objects.filter(branch_id=branch_id).values_list("product_id", "price", "discount_price")
+        }
+        cache.set(key, table, CATALOG_CACHE_TIMEOUT)
+    return table
+
+
+def quote_product(product, table=None) -> Quote:
+    override = (table or {}).get(product.pk)
+    return override or _quote(product.price, product.discount_price)
+
+
+def price_products(products, branch=None):
+    """Attach `.quote` to every product for the branch (one cached table read) and return them."""
+    table = branch_price_table(getattr(branch, "pk", branch))
+    for product in products:
+        product._quote = quote_product(product, table)
+    return products
+
+
+def price_rows(rows, branch=None):
+    """
+    Unit prices for raw (product_id, price, discount_price) rows, e.g. from values_list:
+    {product_id: Quote}. Used where lines are read without model instances.
+    """
+    table = branch_price_table(getattr(branch, "pk", branch))
+    return {
+        product_id: table.get(product_id) or _quote(price, discount_price)
+        for product_id, price, discount_price in rows
+    }
+
+
+def lines_total_paisa(lines) -> int:
+    """Sum of unit x quantity for already priced lines (anything with .product and .quantity)."""
+    return sum(line.product.quote.unit_paisa * line.quantity for line in lines)
@@ -0,0 +1,78 @@
+# core/ratings.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from .models import Product, Review
+
+RATING_FIELDS = [f"rating_{stars}_count" for stars in range(1, 6)]
+
+
+def _prior():
+    mean = float(getattr(settings, "RATING_PRIOR_MEAN", 3.5))
+    weight = float(getattr(settings, "RATING_PRIOR_WEIGHT", 5))
+    return mean, weight
+
+
+def bayesian_score(rating_sum, rating_count) -> float:
+    mean, weight = _prior()
+    return (mean * weight + rating_sum) / (weight + rating_count)
+
+
+def _bucket(rating) -> int:
+    return min(max(int(rating), 1), 5)
+
+
+def _apply(product_id, rating, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one rating with a single UPDATE. F() expressions read the
+    row's current values inside the statement, so concurrent reviews never lose an update.
+    """
+    mean, weight = _prior()
+    bucket = f"rating_{_bucket(rating)}_count"
+    score = (Value(mean * weight) + F("rating_sum") + sign * int(rating)) / (
+        Value(weight, output_field=FloatField()) + F("rating_count") + sign
+    )
+    if sign < 0:
+        # last review gone: back to "unrated" rather than the prior mean
+        score = Case(When(rating_count__lte=1, then=Value(0.0)), default=score, output_field=FloatField())
+    Product.objects.filter(pk=product_id).update(
+        rating_count=F("rating_count") + sign,
+        rating_sum=F("rating_sum") + sign * int(rating),
+        rating_score=score,
+        **{bucket: F(bucket) + sign},
+    )
+
+
+def review_added(review):
+    _apply(review.product_id, review.rating, 1)
+
+
+def review_removed(review):
+    _apply(review.product_id, review.rating, -1)
+
+
+def _empty_stats():
+    return dict.fromkeys(["rating_count", "rating_sum", *RATING_FIELDS], 0)
+
+
+def recompute_rating_stats(product_ids=None):
+    """Rebuild stats from the Review table (repair tool; normal updates are incremental)."""
+    reviews = Review.objects.all()
+    products = Product.objects.all()
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+
+    stats = {}
+    for row in reviews.values("product_id", "rating").annotate(n=Count("id"), total=Sum("rating")):
+        s = stats.setdefault(row["product_id"], _empty_stats())
+        s["rating_count"] += row["n"]
+        s["rating_sum"] += row["total"]
+        s[f"rating_{_bucket(row['rating'])}_count"] += row["n"]
+
+    with transaction.atomic():
+        for product_id in products.values_list("id", flat=True):
+            s = stats.get(product_id, _empty_stats())
+            s["rating_score"] = bayesian_score(s["rating_sum"], s["rating_count"]) if s["rating_count"] else 0
+            Product.objects.filter(pk=product_id).update(**s)
+
@@ -0,0 +1,81 @@
+# core/search.py
+import re
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from .menu import branch_products
+from .fuzzy import spellings
+
+# SQLite: FTS5 table keyed by Product.id (rowid), kept in sync from core/signals.py.
+FTS_TABLE = "core_product_fts"
+# Postgres: must stay identical to the GIN expression index created in migration 0015.
+PG_DOCUMENT = "to_tsvector('simple', coalesce(core_product.name, '') || ' ' || coalesce(core_product.description, ''))"
+SEARCH_RESULT_LIMIT = 60
+
+
+def _terms(query):
+    return re.findall(r"\w+", (query or "").lower())
+
+
+def search_catalog(query, branch=None, limit=SEARCH_RESULT_LIMIT):
+    """
+    Ranked product search honouring branch visibility and availability.
+    Every term is matched as a prefix, so partial words typed in the search box still hit,
+    and is expanded to its known Roman-Urdu/Urdu spellings (see core.fuzzy.SYNONYMS).
+    """
+    terms = _terms(query)
+    qs = branch_products(branch).filter(available=True)
+    if not terms:
+        return qs.none()
+
+    if connection.vendor == "sqlite":
+        match = " AND ".join(
+            "(" + " OR ".join(f'"{w}"*' for w in spellings(t)) + ")" for t in terms
+        )
+        # one join with the FTS table: MATCH runs once and bm25 ranks the joined rows
+        # (a correlated rank subquery would re-run the MATCH for every candidate product)
+        qs = qs.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = core_product.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+            # bm25 is lower-is-better; name hits weigh 10x description hits
+            select={"rank": f"bm25({FTS_TABLE}, 10.0, 1.0)"},
+        ).order_by('rank', 'id')
+    elif connection.vendor == "postgresql":
+        tsquery = " & ".join(
+            "(" + " | ".join(f"{w}:*" for w in spellings(t)) + ")" for t in terms
+        )
+        qs = qs.filter(
+            RawSQL(f"{PG_DOCUMENT} @@ to_tsquery('simple', %s)", (tsquery,), output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f"ts_rank({PG_DOCUMENT}, to_tsquery('simple', %s))", (tsquery,), output_field=FloatField())
+        ).order_by('-rank', 'id')
+    else:
+        for term in terms:
+            term_q = Q()
+            for word in spellings(term):
+                term_q |= Q(name__icontains=word) | Q(description__icontains=word)
+            qs = qs.filter(term_q)
+        qs = qs.order_by('name', 'id')
+    return qs[:limit]
+
+
+# ---------------------------
+# Index maintenance (SQLite only; the Postgres index is an expression index)
+# ---------------------------
+def index_product(product):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (%s, %s, %s)",
+            [product.pk, product.name, product.description or ""],
+        )
+
+
+def unindex_product(product_id):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
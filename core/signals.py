@@ -1,7 +1,17 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
 from .models import UserProfile   # 👈 UserProfile import zaroori hai
+from .models import Branch, BranchPrice, Category, Product, Review, Profile
+from .menu import bump_catalog_version
+from .branches import bump_branch_version
+from .search import index_product, unindex_product
+from . import fuzzy, ratings
+from .jobs import enqueue
+from .cart import SESSION_BRANCH_KEY, merge_guest_cart, recompute_cart_totals, reprice_cart
+from .models import CartItem
 
 User = get_user_model()
 
@@ -9,3 +19,120 @@ User = get_user_model()
 def create_profile_for_new_user(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.get_or_create(user=instance)
+
+
+# Guest cart (signed cookie) moves into the user's Cart on login/registration.
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        merge_guest_cart(request, user)
+        reprice_cart(user, request.session.get(SESSION_BRANCH_KEY))
+
+
+# Catalog cache invalidation: admin list_editable price edits, CRUD views and
+# shell edits all go through Model.save()/delete(), so these cover every path.
+# Product and Category bump through core.fuzzy (below), which moves this worker's
+# in-memory index to the new version in the same after-commit step.
+@receiver([post_save, post_delete], sender=Branch)
+@receiver([post_save, post_delete], sender=BranchPrice)
+def invalidate_catalog_cache(sender, **kwargs):
+    # after commit, so no reader can cache pre-commit rows under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+# Workers reload their in-memory branch registry once the change is committed.
+@receiver([post_save, post_delete], sender=Branch)
+def invalidate_branch_registry(sender, **kwargs):
+    transaction.on_commit(bump_branch_version)
+
+
+# Keep the SQLite FTS index and the fuzzy index in step with the product table.
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, **kwargs):
+    index_product(instance)
+    fuzzy.update_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_search_index(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+    fuzzy.remove_product(instance.pk)
+
+
+# Cart.total_paisa is priced at add time; re-price open carts when a product changes.
+@receiver(post_save, sender=Product)
+def reprice_carts_on_product_save(sender, instance, created, **kwargs):
+    if not created:
+        recompute_cart_totals(CartItem.objects.filter(product=instance).values_list('cart_id', flat=True))
+
+
+@receiver(pre_delete, sender=Product)
+def remember_carts_on_product_delete(sender, instance, **kwargs):
+    instance._cart_ids = list(CartItem.objects.filter(product=instance).values_list('cart_id', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def reprice_carts_on_product_delete(sender, instance, **kwargs):
+    recompute_cart_totals(getattr(instance, '_cart_ids', ()))
+
+
+# Branch price overrides re-price the carts of that branch holding the product.
+@receiver([post_save, post_delete], sender=BranchPrice)
+def reprice_carts_on_branch_price_change(sender, instance, **kwargs):
+    recompute_cart_totals(
+        CartItem.objects.filter(product_id=instance.product_id, cart__branch_id=instance.branch_id)
+        .values_list('cart_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_index(sender, instance, **kwargs):
+    fuzzy.update_category(instance)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_search_index(sender, instance, **kwargs):
+    fuzzy.remove_category(instance.pk)
+
+
+# Denormalized rating stats on Product (one UPDATE per review change).
+@receiver(post_save, sender=Review)
+def add_review_rating(sender, instance, created, **kwargs):
+    if created:
+        ratings.review_added(instance)
+        # the stats live on Product, so cached menus need the new scores too
+        transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    ratings.review_removed(instance)
+    transaction.on_commit(bump_catalog_version)
+
+
+# Responsive renditions for uploaded images, built by the job worker and only when
+# the file actually changed (Profile is re-saved on every User save, e.g. login).
+IMAGE_FIELDS = {Product: "image", Category: "image", Profile: "profile_picture"}
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=Category)
+@receiver(post_init, sender=Profile)
+def remember_image_name(sender, instance, **kwargs):
+    field = IMAGE_FIELDS[sender]
+    if field in instance.__dict__:  # not deferred by only()/defer()
+        instance._loaded_image_name = getattr(instance, field).name
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Profile)
+def build_image_renditions(sender, instance, created, **kwargs):
+    field = IMAGE_FIELDS[sender]
+    if field not in instance.__dict__:
+        return
+    name = getattr(instance, field).name
+    # post_init also runs for new objects, so Product(image=...) looks "unchanged" on create
+    if name and (created or name != getattr(instance, "_loaded_image_name", None)):
+        enqueue("images.build_renditions", name=name)
+        instance._loaded_image_name = name
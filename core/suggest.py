@@ -0,0 +1,105 @@
+# core/suggest.py
+import threading
+from django.urls import reverse
+from .fuzzy import normalize
+from .menu import get_catalog_version, get_categories, get_menu_snapshot
+
+SUGGEST_LIMIT = 8
+# completions kept per trie node (the endpoint asks for at most 20)
+NODE_CAPACITY = 32
+
+
+class PrefixTrie:
+    """Word-prefix trie; every node keeps its best completions so lookup is O(len(prefix))."""
+
+    def __init__(self):
+        self._root = {}
+
+    def insert(self, word, entry):
+        node = self._root
+        for ch in word:
+            node = node.setdefault(ch, {})
+            top = node.setdefault(None, [])
+            if entry not in top and len(top) < NODE_CAPACITY:
+                top.append(entry)
+
+    def complete(self, prefix):
+        node = self._root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        return node.get(None, [])
+
+
+def _entries():
+    """(sort_key, entry) pairs; featured dishes first, then categories, then other dishes."""
+    items = []
+    for products in get_menu_snapshot().values():
+        for p in products:
+            if p.available:
+                entry = ("product", p.id, p.name, p.branch_id)
+                items.append(((0 if p.is_featured else 2, len(p.name), p.name.lower()), entry))
+    for c in get_categories():
+        items.append(((1, len(c.name), c.name.lower()), ("category", c.id, c.name, None)))
+    items.sort(key=lambda item: item[0])
+    return [entry for _, entry in items]
+
+
+def _build_trie(branch_id=None):
+    """Trie of the items visible in a branch (shared ones plus its own; all with no branch)."""
+    trie = PrefixTrie()
+    for entry in _entries():
+        if branch_id is not None and entry[3] not in (None, branch_id):
+            continue
+        name = entry[2]
+        # every word is a starting point, in both the typed and the canonical spelling
+        for word in set(name.lower().split()) | set(normalize(name).split()):
+            trie.insert(word, entry)
+        trie.insert(name.lower(), entry)
+    return trie
+
+
+# One trie per branch, built on first use: node capacity is spent on the items that branch
+# can actually show, so its own dishes are not crowded out by other branches' dishes.
+_lock = threading.Lock()
+_tries = {}
+_tries_version = None
+
+
+def get_trie(branch_id=None):
+    global _tries, _tries_version
+    version = get_catalog_version()
+    with _lock:
+        if _tries_version != version:
+            _tries, _tries_version = {}, version
+        trie = _tries.get(branch_id)
+    if trie is None:
+        trie = _build_trie(branch_id)
+        with _lock:
+            if _tries_version == version:
+                _tries[branch_id] = trie
+    return trie
+
+
+def suggest(prefix, branch_id=None, limit=SUGGEST_LIMIT):
+    """Top completions for a prefix, limited to shared items and the given branch's items."""
+    prefix = " ".join((prefix or "").lower().split())
+    if not prefix:
+        return []
+    trie = get_trie(branch_id)
+    # the trie holds canonical spellings too, so "biriyani" also walks "biryani"
+    entries = trie.complete(prefix)
+    canonical = normalize(prefix)
+    if canonical and canonical != prefix:
+        entries = list(dict.fromkeys([*entries, *trie.complete(canonical)]))
+    results = []
+    for kind, pk, name, _ in entries:
+        if kind == "product":
+            url = reverse('product_detail', args=[pk])
+        else:
+            url = reverse('products_by_category', args=[pk])
+        results.append({"type": kind, "id": pk, "name": name, "url": url})
+        if len(results) >= limit:
+            break
+    return results
@@ -0,0 +1,36 @@
+# core/tasks.py
+"""Background tasks (core.jobs); imported from CoreConfig.ready() so they are registered."""
+import logging
+
+from PIL import UnidentifiedImageError
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+
+from .images import ensure_derivatives
+from .jobs import task
+from .loyalty import award_points_for_order
+
+logger = logging.getLogger(__name__)
+
+
+@task("mail.send")
+def send_mail_task(subject, message, recipient_list, from_email=None):
+    send_mail(subject, message, from_email or settings.DEFAULT_FROM_EMAIL, recipient_list, fail_silently=False)
+
+
+@task("images.build_renditions")
+def build_renditions(name):
+    # a missing or broken upload will not fix itself on retry; log it and move on
+    try:
+        ensure_derivatives(name)
+    except (OSError, UnidentifiedImageError) as e:
+        logger.warning("Could not build renditions for %s: %s", name, e)
+
+
+@task("loyalty.award_order_points")
+def award_order_points(user_id, order_id, total_paisa):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is not None:
+        award_points_for_order(user, total_paisa, order_id=order_id)
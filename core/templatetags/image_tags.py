@@ -0,0 +1,37 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from core.images import derivatives_ready, placeholder_data_uri, rendition_name, rendition_widths, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_img(image, alt="", sizes="100vw", css_class="", style="", width=None):
+    """
+    <picture> with WebP + JPEG srcset and a blurred inline placeholder.
+    `width` picks the JPEG used as plain src for old browsers; falls back to the original
+    file when an upload has no renditions yet.
+    """
+    if not image:
+        return ""
+    name = image.name
+    if not derivatives_ready(name):
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="lazy">', image.url, alt, css_class, style
+        )
+
+    widths = rendition_widths()
+    fallback = min((w for w in widths if width and w >= int(width)), default=widths[-1])
+    lqip = placeholder_data_uri(name)
+    if lqip:
+        style = f"{style};background:url({lqip}) center/cover no-repeat" if style else f"background:url({lqip}) center/cover no-repeat"
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async">'
+        "</picture>",
+        srcset(name, "webp"), sizes,
+        default_storage.url(rendition_name(name, fallback, "jpg")), srcset(name, "jpg"), sizes,
+        alt, css_class, style,
+    )
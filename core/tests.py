@@ -1,16 +1,1048 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qsl
 
-# Create your tests here.
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from django.db import connection
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+from django.core.management import call_command
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.urls import reverse
+from django.utils import timezone
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.create(user=instance)
+from . import cart as cart_service, fuzzy, suggest as suggest_module
+from .fuzzy import fuzzy_products
+from .images import generate_derivatives, placeholder_name, rendition_name
+from .context_processors import request_context
+from .checkout import CheckoutError, DuplicateCheckout, place_order
+from .loyalty import apply_redemption, calc_points_earned, get_profile, redeem_points
+from .models import (
+    Branch, BranchPrice, Cart, CartItem, Category, Job, Order, OrderItem, PointsTransaction, Product, ProductRecommendation,
+    Review,
+)
+from .menu import bump_catalog_version, build_menu_snapshot, get_catalog_version, get_menu_snapshot
+from .money import to_paisa, to_rupees
+from .pagination import keyset_paginate
+from .pricing import Quote, _quote, branch_price_table, price_products
+from .search import search_catalog
+from .suggest import suggest
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.userprofile.save()
+
+# The catalog caches are keyed by a version that only moves on commit, which TestCase never
+# does; every catalog test gets an empty private cache and fresh per-process indexes.
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        fuzzy._index = fuzzy._index_version = None
+        suggest_module._tries, suggest_module._tries_version = {}, None
+
+
+class ShopTestCase(TestCase):
+    """A customer with two dishes in the cart (2 x Rs 450 + 1 x Rs 120.50 = Rs 1020.50)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("customer", password="pw")
+        category = Category.objects.create(name="Karahi")
+        cls.karahi = Product.objects.create(name="Chicken Karahi", price=Decimal("500.00"),
+                                            discount_price=Decimal("450.00"), category=category)
+        cls.raita = Product.objects.create(name="Raita", price=Decimal("120.50"), category=category)
+
+    def setUp(self):
+        cart_service.add_item(self.user, self.karahi, 2)
+        cart_service.add_item(self.user, self.raita, 1)
+
+    def new_order(self):
+        return Order(full_name="Test Customer", phone="03001234567", address="Peshawar")
+
+    def assertCartIntact(self):
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart=cart).values_list("product_id", "quantity")),
+            {self.karahi.id: 2, self.raita.id: 1},
+        )
+        self.assertEqual((cart.item_count, cart.total_paisa), (3, 102050))
+
+
+# ---------------------------
+# Checkout (core.checkout)
+# ---------------------------
+class PlaceOrderTests(ShopTestCase):
+    def test_order_is_priced_and_cart_emptied(self):
+        order = place_order(self.user, self.new_order())
+        self.assertEqual(order.total_paisa, 102050)
+        self.assertEqual(order.total_price, Decimal("1020.50"))
+        self.assertEqual(
+            sorted(order.items.values_list("product_id", "quantity", "price")),
+            sorted([(self.karahi.id, 2, Decimal("450.00")), (self.raita.id, 1, Decimal("120.50"))]),
+        )
+        cart = Cart.objects.get(user=self.user)
+        self.assertFalse(cart.items.exists())
+        self.assertEqual((cart.item_count, cart.total_paisa), (0, 0))
+        self.assertTrue(Job.objects.filter(task="loyalty.award_order_points").exists())
+
+    def test_failure_mid_order_rolls_back(self):
+        # order and items are already written when the loyalty job fails to queue
+        with mock.patch("core.checkout.enqueue", side_effect=RuntimeError("queue down")):
+            with self.assertRaises(RuntimeError):
+                place_order(self.user, self.new_order())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertCartIntact()
+
+    def test_unavailable_product_places_nothing(self):
+        Product.objects.filter(pk=self.raita.pk).update(available=False)
+        with self.assertRaises(CheckoutError):
+            place_order(self.user, self.new_order())
+        self.assertFalse(Order.objects.exists())
+        self.assertCartIntact()
+
+    def test_empty_cart(self):
+        cart_service.clear_cart(Cart.objects.get(user=self.user))
+        with self.assertRaises(CheckoutError):
+            place_order(self.user, self.new_order())
+        self.assertFalse(Order.objects.exists())
+
+
+class RedeemPointsTests(ShopTestCase):
+    def test_insufficient_points_are_clamped_to_balance(self):
+        profile = get_profile(self.user)
+        profile.points_balance = 10
+        profile.save(update_fields=["points_balance"])
+
+        discount = redeem_points(self.user, 500, 102050)
+
+        self.assertEqual(get_profile(self.user).points_balance, 0)
+        self.assertEqual(
+            list(PointsTransaction.objects.filter(user=self.user).values_list("kind", "points")),
+            [(PointsTransaction.REDEEM, 10)],
+        )
+        self.assertGreater(discount, 0)
+
+    def test_no_points_redeems_nothing(self):
+        self.assertEqual(redeem_points(self.user, 500, 102050), Decimal("0.00"))
+        self.assertEqual(get_profile(self.user).points_balance, 0)
+        self.assertFalse(PointsTransaction.objects.exists())
+
+
+class IdempotentCheckoutTests(ShopTestCase):
+    def test_replayed_key_returns_the_same_order(self):
+        order = place_order(self.user, self.new_order(), idempotency_key="abc123")
+        # the customer adds to a fresh cart and the old form is resubmitted
+        cart_service.add_item(self.user, self.raita, 1)
+        with self.assertRaises(DuplicateCheckout) as replay:
+            place_order(self.user, self.new_order(), idempotency_key="abc123")
+        self.assertEqual(replay.exception.order, order)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+    def test_double_submit_places_one_order(self):
+        self.client.force_login(self.user)
+        data = {"full_name": "Test Customer", "phone": "03001234567", "address": "Peshawar",
+                "idempotency_key": "form-key-1"}
+        for _ in range(2):
+            response = self.client.post(reverse("checkout"), data)
+            self.assertRedirects(response, reverse("order_success"), fetch_redirect_response=False)
+        order = Order.objects.get()
+        self.assertEqual(order.total_paisa, 102050)
+
+
+# ---------------------------
+# Money (core.money)
+# ---------------------------
+class MoneyTests(SimpleTestCase):
+    def test_to_paisa_rounds_half_up(self):
+        self.assertEqual(to_paisa("1.005"), 101)
+        self.assertEqual(to_paisa("1.004"), 100)
+        self.assertEqual(to_paisa("-1.005"), -101)
+        self.assertEqual(to_paisa(Decimal("450.00")), 45000)
+        self.assertEqual(to_paisa(12), 1200)
+        self.assertEqual(to_paisa(None), 0)
+
+    def test_to_rupees_is_exact_with_two_places(self):
+        self.assertEqual(str(to_rupees(12345)), "123.45")
+        self.assertEqual(str(to_rupees(5)), "0.05")
+        self.assertEqual(str(to_rupees(0)), "0.00")
+        self.assertEqual(str(to_rupees(None)), "0.00")
+        self.assertEqual(str(to_rupees(-250)), "-2.50")
+
+    def test_round_trip(self):
+        for rupees in ("0.01", "0.10", "99.99", "120.50", "1020.50", "99999999.99"):
+            self.assertEqual(to_rupees(to_paisa(rupees)), Decimal(rupees))
+
+    def test_line_totals_add_up_in_paisa(self):
+        # three Rs 0.10 lines are exactly Rs 0.30; float would give 0.30000000000000004
+        self.assertEqual(to_rupees(sum(to_paisa("0.10") for _ in range(3))), Decimal("0.30"))
+        self.assertEqual(OrderItem(price=Decimal("120.50"), quantity=3).subtotal, Decimal("361.50"))
+
+    def test_quote_uses_discount_only_when_set(self):
+        self.assertEqual(_quote(Decimal("500.00"), Decimal("450.00")), (50000, 45000))
+        self.assertEqual(_quote(Decimal("120.50"), None), (12050, 12050))
+        self.assertEqual(_quote("19.999", None).unit, Decimal("20.00"))
+
+    def test_points_earned_round_down(self):
+        self.assertEqual(calc_points_earned(102050), 20)  # 2% of Rs 1020.50
+        self.assertEqual(calc_points_earned(4999), 0)
+        self.assertEqual(calc_points_earned(0), 0)
+
+
+class RedemptionMathTests(ShopTestCase):
+    def test_discount_clamped_to_balance_and_total(self):
+        profile = get_profile(self.user)
+        profile.points_balance = 300
+        profile.save(update_fields=["points_balance"])
+        self.assertEqual(apply_redemption(self.user, 50, 102050), (50, 5000))
+        # Rs 150.99 total: at most 150 whole points, never a discount above the total
+        self.assertEqual(apply_redemption(self.user, 1000, 15099), (150, 15000))
+        self.assertEqual(apply_redemption(self.user, -5, 102050), (0, 0))
+
+
+# ---------------------------
+# Concurrent cart edits (core.cart)
+# ---------------------------
+def assert_totals_match_lines(test, user):
+    cart = Cart.objects.get(user=user)
+    lines = CartItem.objects.filter(cart=cart).select_related("product")
+    test.assertEqual(cart.item_count, sum(line.quantity for line in lines))
+    test.assertEqual(cart.total_paisa, sum(
+        _quote(line.product.price, line.product.discount_price).unit_paisa * line.quantity for line in lines
+    ))
+
+
+class CartEditTests(ShopTestCase):
+    """Edits from several tabs landing one after another, some on lines another tab removed."""
+
+    def test_stale_edits_keep_totals_in_step(self):
+        karahi = CartItem.objects.get(product=self.karahi)
+        raita = CartItem.objects.get(product=self.raita)
+        self.assertEqual(cart_service.update_quantities(self.user, {karahi.id: 5, raita.id: 0}), 2)
+        cart_service.add_item(self.user, self.raita, 2)
+        self.assertFalse(cart_service.set_quantity(self.user, raita.id, 4))  # removed above
+        self.assertEqual(cart_service.update_quantities(self.user, {raita.id: 9, karahi.id: 5}), 0)
+        self.assertTrue(cart_service.set_quantity(self.user, karahi.id, 1))
+        self.assertTrue(cart_service.remove_item(self.user, karahi.id))
+        self.assertFalse(cart_service.remove_item(self.user, karahi.id))
+        self.assertEqual(
+            list(CartItem.objects.filter(cart__user=self.user).values_list("product_id", "quantity")),
+            [(self.raita.id, 2)],
+        )
+        assert_totals_match_lines(self, self.user)
+
+
+class QuantityCapTests(ShopTestCase):
+    def test_service_caps_every_line(self):
+        line = CartItem.objects.get(product=self.karahi)
+        cart_service.add_item(self.user, self.karahi, 10**12)
+        self.assertEqual(CartItem.objects.get(pk=line.pk).quantity, cart_service.MAX_LINE_QUANTITY)
+        cart_service.add_item(self.user, self.karahi, 1)
+        cart_service.set_quantity(self.user, line.id, 10**12)
+        cart_service.update_quantities(self.user, {CartItem.objects.get(product=self.raita).id: 10**12})
+        self.assertEqual(
+            set(CartItem.objects.filter(cart__user=self.user).values_list("quantity", flat=True)),
+            {cart_service.MAX_LINE_QUANTITY},
+        )
+        assert_totals_match_lines(self, self.user)
+
+    def test_guest_merge_is_capped(self):
+        request = RequestFactory().get("/")
+        request._guest_cart = cart_service.GuestCart({self.karahi.id: 99})
+        cart_service.merge_guest_cart(request, self.user)
+        self.assertEqual(CartItem.objects.get(product=self.karahi).quantity, cart_service.MAX_LINE_QUANTITY)
+        assert_totals_match_lines(self, self.user)
+
+    def test_views_reject_huge_quantities(self):
+        self.client.force_login(self.user)
+        line = CartItem.objects.get(product=self.karahi)
+        api = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+        for url, data in [
+            (reverse("cart_api_add", args=[self.karahi.id]), {"quantity": 10**12}),
+            (reverse("cart_api_update", args=[line.id]), {"quantity": 100}),
+            (reverse("update_cart_batch"), {f"quantity-{line.id}": 10**12}),
+        ]:
+            response = self.client.post(url, data, **api)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(response.json(), {"error": "Invalid quantity."})
+        self.client.post(reverse("update_cart", args=[line.id]), {"quantity": 10**12})
+        self.assertCartIntact()
+
+
+# SQLite has no row locks (select_for_update is a no-op and its shared-cache test database
+# fails concurrent writers outright), so the threaded races run on PostgreSQL.
+@skipUnlessDBFeature("has_select_for_update")
+class ConcurrentCartTests(TransactionTestCase):
+    """Several requests for the same cart at once; the lines and the totals must agree after."""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user("customer", password="pw")
+        category = Category.objects.create(name="Karahi")
+        self.karahi = Product.objects.create(name="Chicken Karahi", price=Decimal("450.00"), category=category)
+        self.raita = Product.objects.create(name="Raita", price=Decimal("120.50"), category=category)
+
+    def run_concurrently(self, *calls):
+        errors, barrier = [], threading.Barrier(len(calls))
+
+        def worker(call):
+            try:
+                barrier.wait()
+                call()
+            except Exception as e:  # surfaced in the main thread below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(call,)) for call in calls]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_adds_keep_every_unit(self):
+        self.run_concurrently(*[lambda: cart_service.add_item(self.user, self.karahi, 1)] * self.THREADS)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user, product=self.karahi).quantity, self.THREADS)
+        assert_totals_match_lines(self, self.user)
+
+    def test_concurrent_quantity_updates_leave_one_winner(self):
+        cart_service.add_item(self.user, self.karahi, 1)
+        cart_service.add_item(self.user, self.raita, 1)
+        karahi = CartItem.objects.get(product=self.karahi)
+        raita = CartItem.objects.get(product=self.raita)
+        calls = []
+        for quantity in range(2, 2 + self.THREADS // 2):
+            calls.append(lambda q=quantity: cart_service.set_quantity(self.user, karahi.id, q))
+            calls.append(lambda q=quantity: cart_service.update_quantities(self.user, {karahi.id: q, raita.id: q}))
+        self.run_concurrently(*calls)
+        self.assertIn(CartItem.objects.get(pk=karahi.pk).quantity, range(2, 2 + self.THREADS // 2))
+        assert_totals_match_lines(self, self.user)
+
+    def test_checkout_racing_edits(self):
+        cart_service.add_item(self.user, self.karahi, 2)
+        cart_service.add_item(self.user, self.raita, 1)
+        karahi = CartItem.objects.get(product=self.karahi)
+        raita = CartItem.objects.get(product=self.raita)
+        order = Order(full_name="Test Customer", phone="03001234567", address="Peshawar")
+        self.run_concurrently(
+            lambda: place_order(self.user, order),
+            lambda: cart_service.set_quantity(self.user, karahi.id, 5),
+            lambda: cart_service.update_quantities(self.user, {karahi.id: 4, raita.id: 3}),
+            lambda: cart_service.add_item(self.user, self.raita, 1),
+            lambda: cart_service.remove_item(self.user, raita.id),
+        )
+        order = Order.objects.get()
+        self.assertEqual(order.total_paisa, sum(to_paisa(i.price) * i.quantity for i in order.items.all()))
+        assert_totals_match_lines(self, self.user)
+
+    def test_concurrent_remove_and_update(self):
+        cart_service.add_item(self.user, self.karahi, 3)
+        line = CartItem.objects.get(product=self.karahi)
+        self.run_concurrently(
+            lambda: cart_service.remove_item(self.user, line.id),
+            lambda: cart_service.set_quantity(self.user, line.id, 5),
+            lambda: cart_service.update_quantities(self.user, {line.id: 7}),
+        )
+        assert_totals_match_lines(self, self.user)
+
+
+# ---------------------------
+# Search (core.search)
+# ---------------------------
+class SearchCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Rice")
+        cls.branch = Branch.objects.create(name="Saddar")
+        other = Branch.objects.create(name="Hayatabad")
+        cls.in_description = Product.objects.create(
+            name="Dum Pukht", description="slow cooked with biryani spices", price=Decimal("900"), category=category)
+        cls.in_name = Product.objects.create(name="Chicken Biryani", price=Decimal("450"), category=category)
+        cls.branch_only = Product.objects.create(
+            name="Sindhi Biryani", price=Decimal("500"), category=category, branch=cls.branch)
+        cls.other_branch = Product.objects.create(
+            name="Bombay Biryani", price=Decimal("500"), category=category, branch=other)
+        Product.objects.create(name="Mutton Biryani", price=Decimal("800"), category=category, available=False)
+
+    def test_name_hits_rank_above_description_hits(self):
+        results = list(search_catalog("biry", self.branch))
+        self.assertEqual(set(results[:2]), {self.in_name, self.branch_only})
+        self.assertEqual(results[2:], [self.in_description])
+
+    def test_spelling_variants_and_branch_visibility(self):
+        self.assertEqual(
+            set(search_catalog("biriyani")),
+            {self.in_name, self.branch_only, self.other_branch, self.in_description},
+        )
+        self.assertNotIn(self.other_branch, search_catalog("biryani", self.branch))
+
+    def test_index_follows_renames(self):
+        self.in_name.name = "Chicken Pulao"
+        self.in_name.save()
+        self.assertEqual(list(search_catalog("pulao")), [self.in_name])
+        self.assertNotIn(self.in_name, search_catalog("biryani"))
+
+    def test_sqlite_matches_once(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("FTS5 index is SQLite only")
+        # a rank subquery per row re-ran the MATCH for every candidate (quadratic)
+        self.assertEqual(str(search_catalog("biryani").query).count("MATCH"), 1)
+
+
+# ---------------------------
+# Fuzzy search (core.fuzzy)
+# ---------------------------
+class FuzzyProductsTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rice = Category.objects.create(name="Pulao")
+        cls.branch = Branch.objects.create(name="Saddar")
+        cls.biryani = Product.objects.create(name="Chicken Biryani", price=Decimal("450"), category=cls.rice)
+        cls.kabuli = Product.objects.create(name="Kabuli Pulao", price=Decimal("600"), category=cls.rice)
+        cls.elsewhere = Product.objects.create(
+            name="Sindhi Biryani", price=Decimal("500"), category=cls.rice, branch=Branch.objects.create(name="Other"))
+        Product.objects.create(name="Mutton Biryani", price=Decimal("800"), category=cls.rice, available=False)
+
+    def test_typos_and_synonyms(self):
+        self.assertEqual(fuzzy_products("biriyani", self.branch), [self.biryani])
+        # "pilau" hits the Pulao category and brings in its visible dishes
+        self.assertCountEqual(fuzzy_products("pilau", self.branch), [self.kabuli, self.biryani])
+        self.assertIn(self.elsewhere, fuzzy_products("biryani"))
+
+    def test_lookup_does_not_read_the_menu_cache(self):
+        fuzzy_products("biryani")
+        with mock.patch("core.fuzzy.get_menu_snapshot") as snapshot:
+            fuzzy_products("karahi")
+            fuzzy_products("biryani", self.branch)
+        snapshot.assert_not_called()
+
+    def test_results_are_copies(self):
+        product = fuzzy_products("biryani", self.branch)[0]
+        product.name = "changed"
+        self.assertEqual(fuzzy_products("biryani", self.branch)[0].name, "Chicken Biryani")
+
+    def test_save_updates_the_index_in_place(self):
+        fuzzy_products("biryani")
+        with mock.patch("core.fuzzy._build_index", wraps=fuzzy._build_index) as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                karahi = Product.objects.create(name="Chicken Karahi", price=Decimal("900"), category=self.rice)
+                self.biryani.available = False
+                self.biryani.save()
+            self.assertEqual(fuzzy_products("karhai"), [karahi])
+            self.assertNotIn(self.biryani, fuzzy_products("biryani"))
+            with self.captureOnCommitCallbacks(execute=True):
+                karahi.delete()
+            self.assertEqual(fuzzy_products("karhai"), [])
+        build.assert_not_called()
+
+    def test_change_from_another_worker_rebuilds(self):
+        fuzzy_products("biryani")
+        Product.objects.create(name="Chicken Karahi", price=Decimal("900"), category=self.rice)
+        self.assertEqual(fuzzy_products("karhai"), [])
+        bump_catalog_version()  # committed elsewhere
+        self.assertEqual([p.name for p in fuzzy_products("karhai")], ["Chicken Karahi"])
+
+
+# ---------------------------
+# Media (core.images, optimize_media)
+# ---------------------------
+def make_image(path, mode="RGB", fmt=None, color=(200, 80, 40), size=(64, 48), **save):
+    from PIL import Image
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new(mode, size, color).save(path, fmt, **save)
+
+
+class MediaTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def media_path(self, name):
+        return os.path.join(self.media, name)
+
+
+class OptimizeMediaTests(MediaTestCase):
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command("optimize_media", "--min-age", "0", "--workers", "1", *args, stdout=out)
+        return out.getvalue()
+
+    def test_unreferenced_duplicates_are_all_orphans(self):
+        for name in ("products/j.png", "pizza.png", "k.png"):
+            make_image(self.media_path(name), fmt="PNG")
+        output = self.run_command("--dry-run")
+        for name in ("products/j.png", "pizza.png", "k.png"):
+            self.assertIn(f"orphan {name}", output)
+        self.assertIn("0 duplicates (0 rows repointed), 3 orphans", output)
+        self.assertNotIn("recompress", output)
+
+    def test_referenced_duplicate_keeps_the_used_name(self):
+        make_image(self.media_path("products/used.png"), fmt="PNG")
+        shutil.copy(self.media_path("products/used.png"), self.media_path("products/a.png"))
+        category = Category.objects.create(name="Drinks")
+        product = Product.objects.create(name="Lassi", price=Decimal("150"), category=category,
+                                         image="products/used.png")
+        self.run_command("--no-recompress")
+        self.assertTrue(os.path.exists(self.media_path("products/used.png")))
+        self.assertFalse(os.path.exists(self.media_path("products/a.png")))
+        product.refresh_from_db()
+        self.assertEqual(product.image.name, "products/used.png")
+
+    def test_recompress_keeps_orientation_and_colour_profile(self):
+        from PIL import Image, ImageCms
+
+        from .management.commands.optimize_media import recompress_file
+
+        path = self.media_path("photo.jpg")
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated 90 degrees
+        icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+        make_image(path, fmt="JPEG", quality=100, exif=exif.tobytes(), icc_profile=icc)
+        _, _, _, status = recompress_file((path, False, -1.0))  # keep whatever comes out
+        self.assertEqual(status, "recompressed")
+        with Image.open(path) as img:
+            self.assertEqual(img.getexif().get(0x0112), 6)
+            self.assertEqual(img.info.get("icc_profile"), icc)
+
+
+class RenditionTests(MediaTestCase):
+    def test_transparent_upload_keeps_alpha_in_webp_and_white_in_jpeg(self):
+        from PIL import Image
+
+        make_image(self.media_path("products/logo.png"), mode="RGBA", color=(0, 0, 0, 0), size=(800, 400))
+        generate_derivatives("products/logo.png")
+        with Image.open(self.media_path(rendition_name("products/logo.png", 360, "webp"))) as webp:
+            self.assertEqual(webp.size, (360, 180))
+            self.assertEqual(webp.convert("RGBA").getpixel((0, 0))[3], 0)
+        for name in (rendition_name("products/logo.png", 360, "jpg"), placeholder_name("products/logo.png")):
+            with Image.open(self.media_path(name)) as jpeg:
+                self.assertGreater(min(jpeg.convert("RGB").getpixel((0, 0))), 240, name)
+
+    def test_small_images_are_not_upscaled(self):
+        from PIL import Image
+
+        make_image(self.media_path("products/small.jpg"), fmt="JPEG", size=(100, 50))
+        generate_derivatives("products/small.jpg")
+        with Image.open(self.media_path(rendition_name("products/small.jpg", 720, "jpg"))) as img:
+            self.assertEqual(img.size, (100, 50))
+
+    def test_job_is_queued_only_when_the_image_changes(self):
+        category = Category.objects.create(name="Drinks")
+        product = Product.objects.create(name="Lassi", price=Decimal("150"), category=category,
+                                         image="products/lassi.jpg")
+        product.price = Decimal("160")
+        product.save()
+        Product.objects.get(pk=product.pk).save()
+        self.assertEqual(
+            list(Job.objects.filter(task="images.build_renditions").values_list("payload", flat=True)),
+            [{"name": "products/lassi.jpg"}],
+        )
+
+    def test_missing_upload_is_logged_not_raised(self):
+        from .tasks import build_renditions
+
+        with self.assertLogs("core.tasks", "WARNING"):
+            build_renditions("products/gone.jpg")
+
+
+# ---------------------------
+# Catalog cache (core.menu)
+# ---------------------------
+class CatalogCacheTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name="Saddar")
+        cls.category = Category.objects.create(name="Karahi")
+        cls.shared = Product.objects.create(name="Chicken Karahi", price=Decimal("900"), category=cls.category)
+        cls.own = Product.objects.create(name="Saddar Special", price=Decimal("1200"), category=cls.category,
+                                         branch=cls.branch)
+        Product.objects.create(name="Other Special", price=Decimal("1100"), category=cls.category,
+                               branch=Branch.objects.create(name="Other"))
+
+    def test_snapshot_is_built_once_per_version(self):
+        snapshot = get_menu_snapshot(self.branch)
+        self.assertEqual(list(snapshot), [self.category])
+        self.assertEqual(snapshot[self.category], [self.shared, self.own])
+        with self.assertNumQueries(0):
+            get_menu_snapshot(self.branch)
+
+    def test_save_invalidates_after_commit(self):
+        get_menu_snapshot()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.shared.price = Decimal("950")
+            self.shared.save()
+            # nothing moves before commit, so no reader caches uncommitted rows under a new version
+            self.assertEqual(get_menu_snapshot()[self.category][0].price, Decimal("900"))
+        self.assertTrue(callbacks)
+        self.assertEqual(get_menu_snapshot()[self.category][0].price, Decimal("950"))
+
+    def test_bumps_never_reuse_a_version(self):
+        before = get_catalog_version()
+        versions = {bump_catalog_version() for _ in range(50)}
+        self.assertEqual(len(versions), 50)
+        self.assertNotIn(before, versions)
+        self.assertEqual(get_catalog_version(), max(versions))
+
+
+# ---------------------------
+# Autocomplete (core.suggest)
+# ---------------------------
+class SuggestTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name="Saddar")
+        other = Branch.objects.create(name="Other")
+        category = Category.objects.create(name="Chicken")
+        Product.objects.bulk_create([
+            Product(name=f"Chicken {n}", price=Decimal("500"), category=category, branch=other, is_featured=True)
+            for n in range(40)
+        ])
+        cls.own = Product.objects.create(name="Chicken Saddar Special", price=Decimal("900"), category=category,
+                                         branch=cls.branch)
+        cls.biryani = Product.objects.create(name="Chicken Biryani", price=Decimal("450"), category=category)
+
+    def names(self, prefix, branch_id=None, limit=20):
+        return [r["name"] for r in suggest(prefix, branch_id, limit)]
+
+    def test_branch_items_are_not_crowded_out(self):
+        # 40 featured dishes of another branch fill the shared "chick" node
+        names = self.names("chick", self.branch.id)
+        self.assertIn("Chicken Saddar Special", names)
+        self.assertIn("Chicken Biryani", names)
+        self.assertFalse([n for n in names if n[len("Chicken "):].isdigit()])
+        self.assertEqual(self.names("sadd", self.branch.id), ["Chicken Saddar Special"])
+
+    def test_spelling_variants_and_any_word(self):
+        self.assertEqual(self.names("biriyani", self.branch.id), ["Chicken Biryani"])
+        self.assertEqual(self.names("  BIRY ", self.branch.id), ["Chicken Biryani"])
+        self.assertEqual(self.names("", self.branch.id), [])
+
+    def test_endpoint(self):
+        session = self.client.session
+        session["selected_branch_id"] = self.branch.id
+        session.save()
+        response = self.client.get(reverse("search_suggest"), {"q": "sadd", "limit": 500})
+        self.assertEqual(response.json()["results"], [{
+            "type": "product", "id": self.own.id, "name": "Chicken Saddar Special",
+            "url": reverse("product_detail", args=[self.own.id]),
+        }])
+
+
+# ---------------------------
+# Keyset pagination (core.pagination)
+# ---------------------------
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("customer", password="pw")
+        cls.orders = Order.objects.bulk_create(
+            Order(user=user, full_name="C", phone="1", address="A") for _ in range(7)
+        )
+        # ties on created_at: only the id keeps the order stable across pages
+        Order.objects.filter(pk__in=[o.pk for o in cls.orders[:4]]).update(created_at=cls.orders[0].created_at)
+
+    def walk(self, source, ordering, per_page=3):
+        pages, query = [], {}
+        while True:
+            page = keyset_paginate(RequestFactory().get("/", query), source, ordering, per_page)
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            query = dict(parse_qsl(page.next_url[1:]))
+
+    def test_forward_pages_cover_every_row_once(self):
+        expected = list(Order.objects.order_by("-created_at", "-id"))
+        for source in (Order.objects.all(), list(Order.objects.all())):
+            pages = self.walk(source, ("-created_at", "-id"))
+            self.assertEqual([len(p) for p in pages], [3, 3, 1])
+            self.assertEqual([o for p in pages for o in p], expected)
+            self.assertFalse(pages[0].has_previous)
+
+    def test_previous_link_returns_the_previous_page(self):
+        first, second, _ = self.walk(Order.objects.all(), ("-created_at", "-id"))
+        query = dict(parse_qsl(second.previous_url[1:]))
+        back = keyset_paginate(RequestFactory().get("/", query), Order.objects.all(), ("-created_at", "-id"), 3)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous)
+
+    def test_tampered_cursor_starts_over(self):
+        page = keyset_paginate(RequestFactory().get("/", {"after": "not-a-cursor"}), Order.objects.all(),
+                               ("-created_at", "-id"), 3)
+        self.assertEqual(list(page), list(Order.objects.order_by("-created_at", "-id")[:3]))
+
+    def test_page_two_reads_like_page_one(self):
+        _, second, _ = self.walk(Order.objects.all(), ("-created_at", "-id"))
+        request = RequestFactory().get("/", dict(parse_qsl(second.next_url[1:])))
+        with self.assertNumQueries(1):
+            keyset_paginate(request, Order.objects.all(), ("-created_at", "-id"), 3).items
+
+
+# ---------------------------
+# Ratings (core.ratings)
+# ---------------------------
+class RatingStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"rater{n}", password="pw") for n in range(3)]
+        cls.product = Product.objects.create(
+            name="Chapli Kabab", price=Decimal("300"), category=Category.objects.create(name="BBQ"))
+
+    def review(self, user, rating):
+        return Review.objects.create(product=self.product, user=user, rating=rating)
+
+    def test_reviews_update_the_stats_incrementally(self):
+        self.review(self.users[0], 5)
+        last = self.review(self.users[1], 4)
+        self.review(self.users[2], 5)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_sum), (3, 14))
+        self.assertEqual(self.product.rating_average, 4.7)
+        self.assertEqual([count for _, count, _ in self.product.rating_histogram], [2, 1, 0, 0, 0])
+        self.assertAlmostEqual(self.product.rating_score, (3.5 * 5 + 14) / 8)
+
+        last.delete()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_4_count), (2, 0))
+
+    def test_last_review_removed_means_unrated(self):
+        self.review(self.users[0], 2).delete()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_score), (0, 0))
+
+    def test_out_of_range_ratings_are_rejected(self):
+        for rating in (0, 6, 50, -3):
+            with self.assertRaises(ValidationError):
+                Review(product=self.product, user=self.users[0], rating=rating).full_clean()
+
+    def test_recompute_repairs_drift(self):
+        self.review(self.users[0], 3)
+        self.review(self.users[1], 5)
+        Product.objects.filter(pk=self.product.pk).update(rating_count=9, rating_sum=1, rating_3_count=0)
+        call_command("recompute_ratings", str(self.product.pk), stdout=io.StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_sum), (2, 8))
+        self.assertEqual((self.product.rating_3_count, self.product.rating_5_count), (1, 1))
+
+
+# ---------------------------
+# Recommendations (build_recommendations)
+# ---------------------------
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("customer", password="pw")
+        category = Category.objects.create(name="BBQ")
+        cls.tikka, cls.naan, cls.raita, cls.lassi = [
+            Product.objects.create(name=name, price=Decimal("100"), category=category)
+            for name in ("Tikka", "Naan", "Raita", "Lassi")
+        ]
+
+    def order(self, *products, status="pending"):
+        order = Order.objects.create(user=self.user, full_name="C", phone="1", address="A", status=status)
+        OrderItem.objects.bulk_create(OrderItem(order=order, product=p, price=p.price) for p in products)
+
+    def build(self, *args):
+        call_command("build_recommendations", "--batch-orders", "1", *args, stdout=io.StringIO())
+
+    def recommended(self, product):
+        return list(ProductRecommendation.objects.filter(product=product).order_by("rank")
+                    .values_list("recommended__name", "count"))
+
+    def test_counts_co_purchases_across_batches(self):
+        self.order(self.tikka, self.naan)
+        self.order(self.tikka, self.naan, self.raita)
+        self.order(self.tikka, self.lassi, status="cancelled")
+        self.build()
+        self.assertEqual(self.recommended(self.tikka), [("Naan", 2), ("Raita", 1)])
+        self.assertEqual(self.recommended(self.raita), [("Tikka", 1), ("Naan", 1)])  # ties by id
+        self.assertEqual(self.recommended(self.lassi), [])
+
+    def test_incremental_run_adds_to_earlier_counts(self):
+        self.order(self.tikka, self.raita)
+        self.build()
+        self.order(self.tikka, self.naan)
+        self.order(self.tikka, self.naan)
+        self.build()
+        self.assertEqual(self.recommended(self.tikka), [("Naan", 2), ("Raita", 1)])
+        self.build("--full", "--top-k", "1")
+        self.assertEqual(self.recommended(self.tikka), [("Naan", 2)])
+
+    def test_product_page_shows_them(self):
+        Product.objects.update(image="products/dish.jpg")  # the page template needs an image
+        self.order(self.tikka, self.naan)
+        self.build()
+        response = self.client.get(reverse("product_detail", args=[self.tikka.id]))
+        # co-purchased dishes only, not the same-category fallback (Raita, Lassi)
+        self.assertEqual(list(response.context["related"]), [self.naan])
+
+
+# ---------------------------
+# Request context (core.context_processors)
+# ---------------------------
+class RequestContextTests(ShopTestCase):
+    def test_nothing_is_queried_until_a_template_reads_it(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        with self.assertNumQueries(0):
+            context = request_context(request)
+        with self.assertNumQueries(1):  # one Cart row serves both badge values
+            self.assertEqual(str(context["cart_item_count"]), "3")
+            self.assertEqual(str(context["cart_total"]), "1020.50")
+        with self.assertNumQueries(0):  # a second template in the same request reuses it
+            self.assertEqual(str(request_context(request)["cart_item_count"]), "3")
+
+    def test_guest_badge_comes_from_the_cookie(self):
+        request = RequestFactory().get("/")
+        request.user = mock.Mock(is_authenticated=False)
+        request._guest_cart = cart_service.GuestCart({self.karahi.id: 2, self.raita.id: 5})
+        with self.assertNumQueries(0):
+            self.assertEqual(str(request_context(request)["cart_item_count"]), "7")
+
+
+# ---------------------------
+# Page cache and conditional GET (core.middleware, core.conditional)
+# ---------------------------
+class PageCacheTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name="Saddar")
+        Product.objects.create(name="Chicken Karahi", price=Decimal("900"), image="products/karahi.jpg",
+                               category=Category.objects.create(name="Karahi"))
+
+    def test_anonymous_menu_pages_are_served_from_cache(self):
+        url = reverse("full_menu")
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "Chicken Karahi")
+        self.assertNotContains(response, "__CSRF_TOKEN__")
+
+    def test_catalog_change_and_branch_get_their_own_entry(self):
+        url = reverse("full_menu")
+        self.client.get(url)
+        bump_catalog_version()
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+        session = self.client.session
+        session["selected_branch_id"] = self.branch.id
+        session.save()
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+
+    def test_logged_in_users_always_get_a_fresh_render(self):
+        self.client.force_login(User.objects.create_user("customer", password="pw"))
+        url = reverse("full_menu")
+        self.client.get(url)
+        self.assertNotIn("X-Page-Cache", self.client.get(url))
+
+
+class ConditionalGetTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("customer", password="pw")
+        cls.product = Product.objects.create(name="Chicken Karahi", price=Decimal("900"), image="products/karahi.jpg",
+                                             category=Category.objects.create(name="Karahi"))
+        cls.order = Order.objects.create(user=cls.user, full_name="C", phone="1", address="A")
+
+    def test_product_page_etag_follows_the_catalog(self):
+        url = reverse("product_detail", args=[self.product.id])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        bump_catalog_version()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_cart_badge_is_part_of_the_etag(self):
+        self.client.force_login(self.user)
+        url = reverse("product_detail", args=[self.product.id])
+        etag = self.client.get(url)["ETag"]
+        cart_service.add_item(self.user, self.product)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_order_page_revalidates_on_status_change(self):
+        self.client.force_login(self.user)
+        url = reverse("order_detail", args=[self.order.id])
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.order.status = "delivered"
+        self.order.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_other_users_orders_stay_hidden(self):
+        self.client.force_login(User.objects.create_user("someone", password="pw"))
+        self.assertEqual(self.client.get(reverse("order_detail", args=[self.order.id])).status_code, 404)
+
+
+# ---------------------------
+# Indexes (check_indexes)
+# ---------------------------
+class IndexTests(TestCase):
+    def test_declared_indexes_exist(self):
+        out = io.StringIO()
+        call_command("check_indexes", stdout=out)
+        self.assertIn("declared indexes/constraints are present", out.getvalue())
+
+    def test_missing_index_is_reported(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX order_status_created_idx")
+        with self.assertRaisesMessage(CommandError, "core_order.order_status_created_idx"):
+            call_command("check_indexes", stdout=io.StringIO())
+
+    def test_hot_queries_use_their_index(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("plan text is SQLite's")
+        user = User.objects.create_user("customer", password="pw")
+        plans = {
+            "order_user_created_idx": Order.objects.filter(user=user).order_by("-created_at", "-id"),
+            "order_status_created_idx": Order.objects.filter(status="pending").order_by("-created_at"),
+            "job_status_run_at_idx": Job.objects.filter(status=Job.QUEUED, run_at__lte=timezone.now()),
+        }
+        for index, qs in plans.items():
+            self.assertIn(index, qs.explain(), index)
+
+
+# ---------------------------
+# Guest cart (core.cart.GuestCart)
+# ---------------------------
+class GuestCartTests(ShopTestCase):
+    def setUp(self):
+        pass  # the guest starts with no cookie; self.user's cart stays empty too
+
+    def guest_lines(self):
+        cookie = self.client.cookies[cart_service.GUEST_CART_COOKIE].value
+        request = RequestFactory().get("/")
+        request.COOKIES[cart_service.GUEST_CART_COOKIE] = cookie
+        return cart_service.GuestCart.from_request(request).lines
+
+    def test_guest_adds_live_in_the_cookie(self):
+        self.client.get(reverse("add_to_cart", args=[self.karahi.id]))
+        self.client.get(reverse("add_to_cart", args=[self.karahi.id]))
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.guest_lines(), {self.karahi.id: 2})
+
+    def test_tampered_cookie_is_an_empty_cart(self):
+        self.client.cookies[cart_service.GUEST_CART_COOKIE] = "eyJ9:forged"
+        response = self.client.get(reverse("view_cart"))
+        self.assertEqual(list(response.context["cart_items"]), [])
+
+    def test_login_merges_into_the_user_cart(self):
+        cart_service.add_item(self.user, self.karahi, 1)
+        self.client.get(reverse("add_to_cart", args=[self.karahi.id]))
+        self.client.get(reverse("add_to_cart", args=[self.raita.id]))
+        self.client.post(reverse("login"), {"username": "customer", "password": "pw"})
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart__user=self.user).values_list("product_id", "quantity")),
+            {self.karahi.id: 2, self.raita.id: 1},
+        )
+        assert_totals_match_lines(self, self.user)
+        self.assertEqual(self.client.cookies[cart_service.GUEST_CART_COOKIE].value, "")
+
+    def test_guest_can_only_update_lines_in_the_cart(self):
+        self.client.get(reverse("add_to_cart", args=[self.karahi.id]))
+        self.assertEqual(
+            self.client.post(reverse("update_cart", args=[self.raita.id]), {"quantity": 3}).status_code, 404)
+        self.client.post(reverse("update_cart", args=[self.karahi.id]), {"quantity": 500})
+        self.assertEqual(self.guest_lines(), {self.karahi.id: 1})
+        self.client.post(reverse("update_cart", args=[self.karahi.id]), {"quantity": 4})
+        self.assertEqual(self.guest_lines(), {self.karahi.id: 4})
+
+
+# ---------------------------
+# Branch pricing (core.pricing)
+# ---------------------------
+class PricingTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("customer", password="pw")
+        category = Category.objects.create(name="Karahi")
+        cls.karahi = Product.objects.create(name="Chicken Karahi", price=Decimal("500.00"),
+                                            discount_price=Decimal("450.00"), category=category)
+        cls.raita = Product.objects.create(name="Raita", price=Decimal("120.50"), category=category)
+        cls.saddar = Branch.objects.create(name="Saddar")
+        BranchPrice.objects.create(branch=cls.saddar, product=cls.karahi, price=Decimal("550.00"))
+
+    def test_quote(self):
+        self.assertTrue(Quote(50000, 45000).discounted)
+        self.assertFalse(Quote(50000, 50000).discounted)
+        self.assertEqual((Quote(12050, 12050).regular, Quote(50000, 45000).unit),
+                         (Decimal("120.50"), Decimal("450.00")))
+
+    def test_branch_price_overrides_the_product_price(self):
+        karahi, raita = price_products(list(Product.objects.order_by("id")), self.saddar)
+        self.assertEqual(karahi.quote, Quote(55000, 55000))  # the branch price has no discount
+        self.assertEqual(raita.quote, Quote(12050, 12050))
+        karahi, _ = price_products(list(Product.objects.order_by("id")))
+        self.assertEqual(karahi.quote, Quote(50000, 45000))
+
+    def test_price_table_is_cached(self):
+        self.assertEqual(branch_price_table(self.saddar.id), {self.karahi.id: Quote(55000, 55000)})
+        with self.assertNumQueries(0):
+            branch_price_table(self.saddar.id)
+            self.assertEqual(branch_price_table(None), {})
+
+    def test_cart_and_checkout_use_the_branch_price(self):
+        cart_service.add_item(self.user, self.karahi, 2, branch=self.saddar)
+        cart_service.add_item(self.user, self.raita, 1, branch=self.saddar)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual((cart.item_count, cart.total_paisa), (3, 2 * 55000 + 12050))
+
+        order = place_order(self.user, Order(full_name="Test Customer", phone="03001234567",
+                                             address="Peshawar", branch=self.saddar))
+        self.assertEqual(order.total_paisa, 2 * 55000 + 12050)
+        self.assertEqual(order.items.get(product=self.karahi).price, Decimal("550.00"))
+
+
+# ---------------------------
+# Menu snapshot (core.menu)
+# ---------------------------
+class MenuSnapshotTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.branch = Branch.objects.create(name="Saddar")
+        other = Branch.objects.create(name="Other")
+        cls.karahi = Category.objects.create(name="Karahi")
+        cls.sweets = Category.objects.create(name="Sweets")
+        Category.objects.create(name="Empty")
+        cls.shared = Product.objects.create(name="Chicken Karahi", price=Decimal("900"), category=cls.karahi,
+                                            image="products/karahi.jpg", is_featured=True)
+        cls.own = Product.objects.create(name="Saddar Special", price=Decimal("1200"), category=cls.karahi,
+                                         image="products/special.jpg", branch=cls.branch)
+        cls.kheer = Product.objects.create(name="Other Kheer", price=Decimal("300"), category=cls.sweets,
+                                           image="products/kheer.jpg", branch=other)
+
+    def test_one_query_for_the_whole_menu(self):
+        with self.assertNumQueries(1):
+            snapshot = build_menu_snapshot()
+            self.assertEqual(snapshot, {self.karahi: [self.shared, self.own], self.sweets: [self.kheer]})
+            self.assertEqual(snapshot[self.karahi][0].quote.unit, Decimal("900"))
+
+    def test_branch_sees_shared_and_own_products_only(self):
+        with self.assertNumQueries(2):  # the menu and the branch price table
+            snapshot = build_menu_snapshot(self.branch)
+        self.assertEqual(snapshot, {self.karahi: [self.shared, self.own]})
+
+    def test_menu_pages_render_from_the_snapshot(self):
+        session = self.client.session
+        session["selected_branch_id"] = self.branch.id
+        session.save()
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["category_products"], {self.karahi: [self.shared, self.own]})
+        self.assertEqual(response.context["featured_products"], [self.shared])
+        response = self.client.get(reverse("full_menu"))
+        self.assertContains(response, "Saddar Special")
+        self.assertNotContains(response, "Other Kheer")
@@ -16,6 +16,7 @@ urlpatterns = [
     path('products/', views.products, name='products'),
     path('products/<int:category_id>/', views.products, name='products_by_category'),
     path('search/', views.search_products, name='search_products'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('contact/', views.contact, name='contact'),
     path('feedback/', views.feedback_view, name='feedback'),
     path('full-menu/', views.full_menu, name='full_menu'),
@@ -29,8 +30,12 @@ urlpatterns = [
     # ================= Cart =================
     path('cart/', views.view_cart, name='view_cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
+    path('cart/update/', views.update_cart_batch, name='update_cart_batch'),
     path('cart/update/<int:item_id>/', views.update_cart, name='update_cart'),
     path('cart/remove/<int:item_id>/', views.remove_cart_item, name='remove_cart_item'),
+    path('cart/api/add/<int:product_id>/', views.cart_api_add, name='cart_api_add'),
+    path('cart/api/update/<int:item_id>/', views.cart_api_update, name='cart_api_update'),
+    path('cart/api/remove/<int:item_id>/', views.cart_api_remove, name='cart_api_remove'),
 
     # ================= Checkout & Orders =================
     path('checkout/', views.checkout, name='checkout'),
@@ -63,7 +68,7 @@ urlpatterns = [
     path('admin-dashboard/products/add/', views.add_product, name='add_product'),
     path('admin-dashboard/products/edit/<int:pk>/', views.edit_product, name='edit_product'),
     path('admin-dashboard/products/delete/<int:pk>/', views.delete_product, name='delete_product'),
-    path('product/<int:pk>/', views.product_detail, name='product_detail'),
+    path('product/<int:product_id>/', views.product_detail, name='product_detail'),
 
     # ================= Loyalty =================
     path("loyalty/", views.loyalty_dashboard, name="loyalty_dashboard"),
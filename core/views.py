@@ -1,3 +1,4 @@
+from datetime import timedelta
 from decimal import Decimal
 import stripe
 
@@ -8,25 +9,44 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth.views import LoginView
 from django.contrib.admin.views.decorators import staff_member_required
-from django.core.mail import send_mail
-from django.db.models import Q, Sum, Count
+from django.db import transaction
+from django.db.models import Sum, Count
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.decorators.http import require_POST
+from django.utils import timezone
+from django.views.decorators.http import condition, require_POST
 
 from .models import (
-    Branch, Category, Product, Cart, CartItem,
-    Order, OrderItem, Review, NewsletterSubscriber, Feedback,
-    PointsTransaction
+    Category, Product, Cart,
+    Order, Review, NewsletterSubscriber,
+    PointsTransaction, ProductRecommendation, IdempotencyKey
 )
 from .forms import (
     CategoryForm, ProductForm, OrderForm,
     ProductFilterForm, ReviewForm, ContactForm,
     NewsletterForm, OrderStatusForm, FeedbackForm, CustomUserCreationForm
 )
-from .loyalty import get_profile, apply_redemption, redeem_points, award_points_for_order
+from .loyalty import get_profile, apply_redemption
+from .menu import get_menu_snapshot, get_categories, featured_from_snapshot
+from .search import search_catalog
+from .fuzzy import fuzzy_products
+from .suggest import suggest, SUGGEST_LIMIT
+from .pagination import keyset_paginate
+from .branches import all_branches, get_branch
+from .conditional import catalog_etag, order_etag, order_last_modified
+from . import cart as cart_service
+from .cart import get_guest_cart
+from .pricing import price_products
+from .money import to_paisa, to_rupees
+from .checkout import CheckoutError, DuplicateCheckout, place_order
+from .idempotency import claim as claim_idempotency_key, new_key as new_idempotency_key
+from .jobs import enqueue
 
 SESSION_BRANCH_KEY = "selected_branch_id"
 
+# Stripe checkout sessions expire after 24h; reuse a stored one only while it is still valid
+STRIPE_SESSION_REUSE = timedelta(hours=23)
+
 # configure stripe api key from settings (ensure settings has STRIPE_SECRET_KEY)
 stripe.api_key = getattr(settings, "STRIPE_SECRET_KEY", None)
 
@@ -40,28 +60,24 @@ def _get_or_create_cart_for_user(user):
 def _get_selected_branch(request):
     branch_id = request.session.get(SESSION_BRANCH_KEY)
     if branch_id:
-        return Branch.objects.filter(id=branch_id).first()
+        return get_branch(branch_id)
     return None
 
 
+def _reprice_cart(request, branch):
+    """Prices differ per branch; keep a logged-in user's cart totals on the selected one."""
+    if request.user.is_authenticated:
+        cart_service.reprice_cart(request.user, branch)
+
+
 # ---------------- Public Views ----------------
 def home(request):
     selected_branch = _get_selected_branch(request)
-    categories = Category.objects.all()
-    category_products = {}
-    for category in categories:
-        qs = Product.objects.filter(category=category)
-        if selected_branch:
-            qs = qs.filter(Q(branch__isnull=True) | Q(branch=selected_branch))
-        if qs.exists():
-            category_products[category] = qs
+    categories = get_categories()
+    category_products = get_menu_snapshot(selected_branch)
+    featured_products = featured_from_snapshot(category_products)
 
-    featured_products = Product.objects.filter(is_featured=True)
-    if selected_branch:
-        featured_products = featured_products.filter(Q(branch__isnull=True) | Q(branch=selected_branch))
-    featured_products = featured_products[:8]
-
-    available_branches = Branch.objects.all()
+    available_branches = all_branches()
 
     return render(request, 'home.html', {
         'categories': categories,
@@ -72,16 +88,10 @@ def home(request):
     })
 
 
+@condition(etag_func=catalog_etag)
 def full_menu(request):
     selected_branch = _get_selected_branch(request)
-    categories = Category.objects.all()
-    category_products = {}
-    for category in categories:
-        qs = Product.objects.filter(category=category)
-        if selected_branch:
-            qs = qs.filter(Q(branch__isnull=True) | Q(branch=selected_branch))
-        if qs.exists():
-            category_products[category] = qs
+    category_products = get_menu_snapshot(selected_branch)
     return render(request, 'full_menu.html', {
         'category_products': category_products,
         'selected_branch': selected_branch
@@ -89,53 +99,91 @@ def full_menu(request):
 
 
 def categories(request):
-    return render(request, 'categories.html', {'categories': Category.objects.all()})
+    return render(request, 'categories.html', {'categories': get_categories()})
 
 
 def products(request, category_id=None):
     """Products list with optional category filter and price filter."""
     selected_branch = _get_selected_branch(request)
-    products_qs = Product.objects.all()
+    snapshot = get_menu_snapshot(selected_branch)
+    category_list = get_categories()
 
     category = None
     if category_id:
-        category = get_object_or_404(Category, id=category_id)
-        products_qs = products_qs.filter(category=category)
-
-    if selected_branch:
-        products_qs = products_qs.filter(Q(branch__isnull=True) | Q(branch=selected_branch))
+        category = next((c for c in category_list if c.id == category_id), None)
+        if category is None:
+            raise Http404("No Category matches the given query.")
+        product_list = list(snapshot.get(category, []))
+    else:
+        product_list = [p for items in snapshot.values() for p in items]
 
     form = ProductFilterForm(request.GET or None)
     if form.is_valid():
         min_price = form.cleaned_data.get('min_price')
         max_price = form.cleaned_data.get('max_price')
         if min_price is not None:
-            products_qs = products_qs.filter(price__gte=min_price)
+            product_list = [p for p in product_list if p.quote.unit >= min_price]
         if max_price is not None:
-            products_qs = products_qs.filter(price__lte=max_price)
+            product_list = [p for p in product_list if p.quote.unit <= max_price]
 
-    categories_qs = Category.objects.all()
+    if request.GET.get('sort') == 'rating':
+        page = keyset_paginate(request, product_list, ('-rating_score', 'id'))
+    else:
+        page = keyset_paginate(request, product_list, ('name', 'id'))
 
     return render(request, 'products.html', {
         'category': category,
-        'products': products_qs,
+        'products': page,
+        'page': page,
         'filter_form': form,
-        'categories': categories_qs,
+        'categories': category_list,
         'selected_branch': selected_branch
     })
 
 
 def search_products(request):
     query = request.GET.get('q', '').strip()
-    products = Product.objects.filter(Q(name__icontains=query) | Q(description__icontains=query)) if query else Product.objects.none()
+    products = []
+    if query:
+        selected_branch = _get_selected_branch(request)
+        products = list(search_catalog(query, selected_branch))
+        # typo-tolerant matches (e.g. "biriyani", "pilau") after the exact full-text hits
+        seen = {p.id for p in products}
+        products += [p for p in fuzzy_products(query, selected_branch) if p.id not in seen]
+        price_products(products, selected_branch)
     return render(request, 'search_results.html', {'query': query, 'products': products})
 
 
+def search_suggest(request):
+    """As-you-type suggestions as compact JSON, answered from the in-process prefix trie."""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', SUGGEST_LIMIT)), 20))
+    except (TypeError, ValueError):
+        limit = SUGGEST_LIMIT
+    try:
+        branch_id = int(request.session.get(SESSION_BRANCH_KEY))
+    except (TypeError, ValueError):
+        branch_id = None
+    return JsonResponse(
+        {'q': query, 'results': suggest(query, branch_id, limit)},
+        json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False},
+    )
+
+
+@condition(etag_func=catalog_etag)
 def product_detail(request, product_id):
     """Single product detail with review form handling."""
     product = get_object_or_404(Product, id=product_id)
-    reviews = Review.objects.filter(product=product).order_by('-created_at')
-    related = Product.objects.filter(category=product.category).exclude(id=product.id)[:4]
+    reviews = Review.objects.filter(product=product).select_related('user').order_by('-created_at')
+    # "frequently bought together" from build_recommendations; same-category fallback for new dishes
+    related = [
+        rec.recommended for rec in
+        ProductRecommendation.objects.filter(product=product, recommended__available=True).select_related('recommended')
+    ]
+    if not related:
+        related = Product.objects.filter(category=product.category).exclude(id=product.id)[:4]
+    price_products([product], _get_selected_branch(request))
 
     form = ReviewForm(request.POST or None)
     if request.method == 'POST':
@@ -146,7 +194,8 @@ def product_detail(request, product_id):
             review = form.save(commit=False)
             review.product = product
             review.user = request.user
-            review.save()
+            with transaction.atomic():
+                review.save()
             messages.success(request, "Review submitted.")
             return redirect('product_detail', product_id=product.id)
         else:
@@ -180,95 +229,201 @@ def register(request):
 
 
 # ---------------- Cart ----------------
-@login_required
+# Guests get a cookie cart (core.cart.GuestCart); it is merged into Cart on login.
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    cart = _get_or_create_cart_for_user(request.user)
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart, product=product, defaults={'quantity': 1}
-    )
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    if not request.user.is_authenticated:
+        get_guest_cart(request).add(product.id)
+        messages.success(request, f"{product.name} added to cart.")
+        return redirect('view_cart')
+
+    cart_service.add_item(request.user, product, branch=_get_selected_branch(request))
     messages.success(request, f"{product.name} added to cart.")
     return redirect('view_cart')
 
 
-@login_required
 def view_cart(request):
-    cart = _get_or_create_cart_for_user(request.user)
-    cart_items = CartItem.objects.filter(cart=cart).select_related('product')
-    total_price = Decimal('0.00')
-    for item in cart_items:
-        item_price = item.product.price or Decimal('0.00')
-        item_total = item_price * item.quantity
-        setattr(item, 'item_total', item_total)
-        total_price += item_total
+    if request.user.is_authenticated:
+        cart_items = cart_service.user_lines(request.user)
+    else:
+        cart_items = get_guest_cart(request).items()
+    _, total_price = cart_service.cart_totals(request)
     return render(request, 'cart.html', {'cart_items': cart_items, 'total_price': total_price})
 
 
-@login_required
 @require_POST
 def update_cart(request, item_id):
-    cart = _get_or_create_cart_for_user(request.user)
-    cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-    try:
-        quantity = int(request.POST.get("quantity", 1))
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-        else:
-            cart_item.delete()
-    except (ValueError, TypeError):
+    """item_id is a CartItem id, or the product id for a guest cart line."""
+    quantity = _posted_quantity(request)
+    if quantity is None:
         messages.error(request, "Invalid quantity.")
+        return redirect('view_cart')
+
+    if not request.user.is_authenticated:
+        guest = get_guest_cart(request)
+        if item_id not in guest.lines:  # only lines already in the cart, like update_cart_batch
+            raise Http404("Cart item not found")
+        guest.set(item_id, quantity)
+        return redirect('view_cart')
+
+    if not cart_service.set_quantity(request.user, item_id, quantity):
+        raise Http404("Cart item not found")
+    return redirect('view_cart')
+
+
+@require_POST
+def update_cart_batch(request):
+    """All cart quantities in one POST: quantity-<item id> fields (item id = product id for guests)."""
+    quantities = {}
+    for key, value in request.POST.items():
+        if not key.startswith('quantity-'):
+            continue
+        try:
+            quantity = int(value)
+            if quantity > cart_service.MAX_LINE_QUANTITY:
+                raise ValueError(value)
+            quantities[int(key[len('quantity-'):])] = quantity
+        except (TypeError, ValueError):
+            if _wants_json(request):
+                return JsonResponse({'error': 'Invalid quantity.'}, status=400)
+            messages.error(request, "Invalid quantity.")
+            return redirect('view_cart')
+
+    if request.user.is_authenticated:
+        cart_service.update_quantities(request.user, quantities)
+    else:
+        guest = get_guest_cart(request)
+        for product_id, quantity in quantities.items():
+            if product_id in guest.lines:
+                guest.set(product_id, quantity)
+
+    if _wants_json(request):
+        # the cart page batches quantity edits (debounced) into this one request
+        lines = cart_service.user_lines(request.user) if request.user.is_authenticated else get_guest_cart(request).items()
+        return JsonResponse(
+            {
+                'lines': [cart_service.line_payload(line) for line in lines if line.id in quantities],
+                'cart': cart_service.cart_summary(request),
+            },
+            json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False},
+        )
+    messages.success(request, "Cart updated.")
     return redirect('view_cart')
 
 
-@login_required
 def remove_cart_item(request, item_id):
-    cart = _get_or_create_cart_for_user(request.user)
-    cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-    cart_item.delete()
+    if not request.user.is_authenticated:
+        get_guest_cart(request).remove(item_id)
+        messages.success(request, "Item removed from cart.")
+        return redirect('view_cart')
+
+    if not cart_service.remove_item(request.user, item_id):
+        raise Http404("Cart item not found")
     messages.success(request, "Item removed from cart.")
     return redirect('view_cart')
 
 
+# ---------------- Cart JSON API ----------------
+# Same mutations as above, but answers with just the changed line and the totals so
+# the cart page and add buttons update in place instead of redirect + full re-render.
+def _cart_api_response(request, line):
+    return JsonResponse(
+        {'line': cart_service.line_payload(line), 'cart': cart_service.cart_summary(request)},
+        json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False},
+    )
+
+
+def _wants_json(request):
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def _posted_quantity(request, default=1):
+    """The posted quantity, or None when it is not a number or above the per-line cap."""
+    try:
+        quantity = int(request.POST.get('quantity', default))
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity <= cart_service.MAX_LINE_QUANTITY else None
+
+
+@require_POST
+def cart_api_add(request, product_id):
+    quantity = _posted_quantity(request)
+    if quantity is None or quantity < 1:
+        return JsonResponse({'error': 'Invalid quantity.'}, status=400)
+    product = Product.objects.filter(id=product_id).first()
+    if product is None:
+        return JsonResponse({'error': 'Product not found.'}, status=404)
+    if request.user.is_authenticated:
+        cart_service.add_item(request.user, product, quantity, branch=_get_selected_branch(request))
+    else:
+        get_guest_cart(request).add(product_id, quantity)
+    return _cart_api_response(request, cart_service.find_line(request, product_id=product_id))
+
+
+@require_POST
+def cart_api_update(request, item_id):
+    quantity = _posted_quantity(request)
+    if quantity is None:
+        return JsonResponse({'error': 'Invalid quantity.'}, status=400)
+    if request.user.is_authenticated:
+        if not cart_service.set_quantity(request.user, item_id, quantity):
+            return JsonResponse({'error': 'Cart item not found.'}, status=404)
+    else:
+        guest = get_guest_cart(request)
+        if item_id not in guest.lines:
+            return JsonResponse({'error': 'Cart item not found.'}, status=404)
+        guest.set(item_id, quantity)
+    line = cart_service.find_line(request, item_id=item_id) if quantity > 0 else None
+    return _cart_api_response(request, line)
+
+
+@require_POST
+def cart_api_remove(request, item_id):
+    if request.user.is_authenticated:
+        if not cart_service.remove_item(request.user, item_id):
+            return JsonResponse({'error': 'Cart item not found.'}, status=404)
+    else:
+        get_guest_cart(request).remove(item_id)
+    return _cart_api_response(request, None)
+
+
 # ---------------- Checkout & Orders ----------------
 @login_required
 def checkout(request):
-    cart = _get_or_create_cart_for_user(request.user)
-    cart_items = CartItem.objects.filter(cart=cart).select_related('product')
-    if not cart_items.exists():
+    # issued with the form; a double submit or refresh replays the same key
+    idempotency_key = request.POST.get('idempotency_key') or new_idempotency_key()
+    if request.method == "POST" and IdempotencyKey.objects.filter(
+        user=request.user, scope=IdempotencyKey.CHECKOUT, key=idempotency_key[:64]
+    ).exists():
+        return redirect("order_success")
+
+    cart_items = cart_service.user_lines(request.user)
+    if not cart_items:
         messages.error(request, "Your cart is empty.")
         return redirect('view_cart')
 
     form = OrderForm(request.POST or None)
     if request.method == "POST" and form.is_valid():
         order = form.save(commit=False)
-        order.user = request.user
         selected_branch = _get_selected_branch(request)
         if selected_branch:
             order.branch = selected_branch
-
-        total_price = sum((item.product.price or Decimal('0.00')) * item.quantity for item in cart_items)
-        order.total_price = total_price
-        order.save()
-
-        for item in cart_items:
-            OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, price=item.product.price)
-        cart_items.delete()
-
-        # award loyalty points (safe call)
         try:
-            award_points_for_order(request.user, order)
-        except Exception:
-            pass
+            place_order(request.user, order, idempotency_key=idempotency_key[:64])
+        except DuplicateCheckout:
+            return redirect("order_success")
+        except CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect('view_cart')
 
         messages.success(request, "Order placed successfully.")
         return redirect("order_success")
 
-    total = sum((item.product.price or Decimal('0.00')) * item.quantity for item in cart_items)
-    return render(request, "checkout.html", {"cart_items": cart_items, "form": form, "total": total})
+    _, total = cart_service.cart_totals(request)
+    return render(request, "checkout.html", {
+        "cart_items": cart_items, "form": form, "total": total, "idempotency_key": idempotency_key,
+    })
 
 
 @login_required
@@ -278,17 +433,20 @@ def order_success(request):
 
 @login_required
 def my_orders(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'my_orders.html', {'orders': orders})
+    orders = Order.objects.filter(user=request.user).prefetch_related('items__product')
+    page = keyset_paginate(request, orders, ('-created_at', '-id'))
+    return render(request, 'my_orders.html', {'orders': page, 'page': page})
 
 
 @login_required
+@condition(etag_func=order_etag, last_modified_func=order_last_modified)
 def order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     return render(request, "order_detail.html", {"order": order})
 
 
 @login_required
+@condition(etag_func=order_etag, last_modified_func=order_last_modified)
 def track_order(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     return render(request, 'track_order.html', {'order': order})
@@ -301,7 +459,7 @@ def admin_dashboard(request):
 
     # Stats
     total_orders = orders.count()
-    total_revenue = orders.aggregate(total=Sum('total_price'))['total'] or Decimal('0.00')
+    total_revenue = to_rupees(orders.aggregate(total=Sum('total_paisa'))['total'])
     total_customers = User.objects.filter(is_superuser=False).count()
 
     # Chart data (status wise count)
@@ -310,7 +468,7 @@ def admin_dashboard(request):
     data = [sc['count'] for sc in status_counts]
 
     return render(request, 'admin_dashboard.html', {
-        'orders': orders,
+        'orders': keyset_paginate(request, orders, ('-created_at', '-id')),
         'total_orders': total_orders,
         'total_revenue': total_revenue,
         'total_customers': total_customers,
@@ -321,8 +479,8 @@ def admin_dashboard(request):
 
 @staff_member_required
 def admin_orders(request):
-    orders = Order.objects.all().order_by('-created_at')
-    return render(request, 'admin/manage_orders.html', {'orders': orders})
+    page = keyset_paginate(request, Order.objects.all(), ('-created_at', '-id'))
+    return render(request, 'admin/manage_orders.html', {'orders': page, 'page': page})
 
 
 @staff_member_required
@@ -374,8 +532,8 @@ def delete_category(request, pk):
 
 @staff_member_required
 def manage_products(request):
-    products = Product.objects.all()
-    return render(request, 'admin/manage_products.html', {'products': products})
+    page = keyset_paginate(request, Product.objects.select_related('category'), ('name', 'id'))
+    return render(request, 'admin/manage_products.html', {'products': page, 'page': page})
 
 
 @staff_member_required
@@ -417,7 +575,8 @@ def add_review(request, product_id):
         review = form.save(commit=False)
         review.user = request.user
         review.product = product
-        review.save()
+        with transaction.atomic():
+            review.save()
         messages.success(request, "Review added.")
     else:
         messages.error(request, "Invalid review data.")
@@ -434,12 +593,10 @@ def contact(request):
             f"From: {form.cleaned_data['name']} <{form.cleaned_data['email']}>\n\n"
             f"{form.cleaned_data['message']}"
         )
-        try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [settings.DEFAULT_FROM_EMAIL])
-            success = True
-            messages.success(request, 'Your message has been sent!')
-        except Exception as e:
-            messages.error(request, f"Error sending email: {e}")
+        # sent by the job worker; a slow SMTP server no longer holds up the request
+        enqueue("mail.send", subject=subject, message=message, recipient_list=[settings.DEFAULT_FROM_EMAIL])
+        success = True
+        messages.success(request, 'Your message has been sent!')
     return render(request, 'contact.html', {'form': form, 'success': success})
 
 
@@ -451,17 +608,13 @@ def newsletter_signup(request):
             email = form.cleaned_data['email']
             if not NewsletterSubscriber.objects.filter(email=email).exists():
                 subscriber = form.save()
-                try:
-                    send_mail(
-                        'Thank you for subscribing!',
-                        'You have successfully subscribed to Super Shinwari Restaurant newsletter.',
-                        settings.DEFAULT_FROM_EMAIL,
-                        [subscriber.email],
-                        fail_silently=False,
-                    )
-                    messages.success(request, 'Subscribed successfully! Please check your email.')
-                except Exception:
-                    messages.warning(request, 'Subscribed but email could not be sent.')
+                enqueue(
+                    "mail.send",
+                    subject='Thank you for subscribing!',
+                    message='You have successfully subscribed to Super Shinwari Restaurant newsletter.',
+                    recipient_list=[subscriber.email],
+                )
+                messages.success(request, 'Subscribed successfully! Please check your email.')
             else:
                 messages.info(request, "You are already subscribed.")
         else:
@@ -513,11 +666,12 @@ def select_branch(request):
     branch_id = request.POST.get('branch_id')
     next_url = request.POST.get('next') or request.META.get('HTTP_REFERER', '/')
     if branch_id:
-        try:
-            branch = Branch.objects.get(pk=int(branch_id))
+        branch = get_branch(branch_id)
+        if branch:
             request.session[SESSION_BRANCH_KEY] = branch.id
+            _reprice_cart(request, branch)
             messages.success(request, f"Branch selected: {branch.name}")
-        except (Branch.DoesNotExist, ValueError):
+        else:
             messages.error(request, "Selected branch not found.")
     else:
         messages.error(request, "No branch selected.")
@@ -525,14 +679,18 @@ def select_branch(request):
 
 
 def select_branch_by_id(request, branch_id):
-    branch = get_object_or_404(Branch, id=branch_id)
+    branch = get_branch(branch_id)
+    if branch is None:
+        raise Http404("Branch not found")
     request.session[SESSION_BRANCH_KEY] = branch.id
+    _reprice_cart(request, branch)
     messages.success(request, f"Branch selected: {branch.name}")
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
 
 def clear_branch(request):
     request.session.pop(SESSION_BRANCH_KEY, None)
+    _reprice_cart(request, None)
     messages.success(request, "Branch selection cleared.")
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
@@ -547,6 +705,7 @@ def user_dashboard(request):
 def set_branch(request, branch_id):
     """Alternate branch selector using the same SESSION_BRANCH_KEY."""
     request.session[SESSION_BRANCH_KEY] = branch_id
+    _reprice_cart(request, get_branch(branch_id))
     messages.success(request, "Branch changed successfully.")
     return redirect('home')
 
@@ -571,12 +730,13 @@ def apply_points(request):
     """
     try:
         points_requested = int(request.POST.get("points", 0))
-        order_total = Decimal(request.POST.get("order_total", "0"))
+        order_total = to_paisa(Decimal(request.POST.get("order_total", "0")))
     except Exception:
         messages.error(request, "Invalid points amount.")
         return redirect(request.META.get("HTTP_REFERER", "/"))
 
-    points, discount = apply_redemption(request.user, points_requested, order_total)
+    points, discount_paisa = apply_redemption(request.user, points_requested, order_total)
+    discount = to_rupees(discount_paisa)
 
     request.session["loyalty_redeem"] = {
         "points": points,
@@ -592,7 +752,7 @@ def create_checkout_session(request, order_id):
     """
     Create stripe checkout session for a given order.
     - ensures order exists and belongs to current user (or staff).
-    - uses order.total_price if available, else tries order.total_amount.
+    - charges order.total_paisa (Stripe takes the amount in minor units).
     """
     order = get_object_or_404(Order, id=order_id)
 
@@ -601,9 +761,7 @@ def create_checkout_session(request, order_id):
         messages.error(request, "You are not authorized to pay for this order.")
         return redirect('my_orders')
 
-    # determine order amount (Decimal)
-    order_amount = getattr(order, "total_price", None) or getattr(order, "total_amount", None)
-    if order_amount is None:
+    if not order.total_paisa:
         messages.error(request, "Order has no amount set.")
         return redirect('order_detail', order_id=order.id)
 
@@ -611,9 +769,16 @@ def create_checkout_session(request, order_id):
         messages.error(request, "Payment gateway not configured. Contact admin.")
         return redirect('order_detail', order_id=order.id)
 
+    # a refresh/double click reuses the session already created for this order
+    record, _ = claim_idempotency_key(order.user, IdempotencyKey.PAYMENT, f"order-{order.id}")
+    if record.response.get('url') and timezone.now() - record.created_at > STRIPE_SESSION_REUSE:
+        record.delete()
+        record, _ = claim_idempotency_key(order.user, IdempotencyKey.PAYMENT, f"order-{order.id}")
+    if record.response.get('url'):
+        return redirect(record.response['url'], code=303)
+
     try:
-        # convert to integer cents/paisa (e.g., multiply by 100)
-        unit_amount = int((Decimal(order_amount) * 100).quantize(Decimal('1.')))
+        unit_amount = order.total_paisa
 
         # choose currency from settings (default to PKR if not set) and ensure lowercase
         currency = getattr(settings, "PAYMENT_CURRENCY", "PKR").lower()
@@ -633,7 +798,11 @@ def create_checkout_session(request, order_id):
             mode='payment',
             success_url=request.build_absolute_uri(f'/payment/success/?order={order.id}'),
             cancel_url=request.build_absolute_uri(f'/payment/cancel/?order={order.id}'),
+            # concurrent requests that both missed the row get the same session from Stripe
+            idempotency_key=f"checkout-session-{record.pk}",
         )
+        record.order, record.response = order, {'id': session.id, 'url': session.url}
+        record.save(update_fields=['order', 'response'])
         return redirect(session.url, code=303)
     except stripe.error.StripeError as e:
         messages.error(request, f"Stripe error: {str(e)}")
@@ -1,6 +1,7 @@
 from pathlib import Path
 from decimal import Decimal
 import os
+import tempfile
 import dj_database_url   # deployment k liye
 
 # ---------- Base Directory ----------
@@ -38,6 +39,8 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.GuestCartMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -57,8 +60,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 # Custom Context Processors
-                'core.context_processors.cart_and_branch_context',
-                'core.context_processors.cart_item_count',
+                'core.context_processors.request_context',
             ],
         },
     },
@@ -77,6 +79,33 @@ DATABASES = {
     )
 }
 
+# ---------- Cache ----------
+# Menu/catalog cache sab gunicorn workers me same hona chahiye, is liye default
+# file based cache (no extra dependency). Redis/memcached env se set kar sakte ho.
+# Catalog version har bump par naya token set karta hai (incr nahi), is liye file cache
+# ka non-atomic incr yahan masla nahi.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        'LOCATION': os.getenv("CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "super_shinwari_cache")),
+    }
+}
+
+# Anonymous menu pages ka full HTML (core.middleware); catalog version change par
+# khud purana ho jata hai, timeout sirf template/deploy changes ke liye hai.
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# ---------- Sessions ----------
+# Session reads cache se (DB sirf write/miss par), taake branch lookup jaise
+# chhote JSON endpoints DB cursor open na karein.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# ---------- Background Jobs ----------
+# Emails, loyalty points aur image renditions `python manage.py run_worker` chalata hai (core/jobs.py).
+# Production me Procfile ka `worker:` process zaroor chalao, warna har job queue me hi pari rehti hai.
+# Dev me worker na chalana ho to JOBS_RUN_INLINE=True: job request ke commit ke baad wahin chal jata hai.
+JOBS_RUN_INLINE = os.getenv("JOBS_RUN_INLINE", "False") == "True"
+
 # ---------- Password Validation ----------
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -100,6 +129,9 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Upload par har image ki in widths (px) ki WebP/JPEG copies banti hain (core/images.py)
+IMAGE_RENDITION_WIDTHS = (60, 120, 180, 360, 720)
+
 # ---------- Default Auto Field ----------
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -125,6 +157,12 @@ LANGUAGES = [
 LOYALTY_EARN_RATE = Decimal("0.02")
 LOYALTY_POINT_VALUE = Decimal("1.0")
 
+# ---------- Rating Settings ----------
+# Bayesian rating: har product ko itne "virtual" reviews (prior mean par) milte hain,
+# taake 1 review wala 5-star product top par na aa jaye.
+RATING_PRIOR_MEAN = 3.5
+RATING_PRIOR_WEIGHT = 5
+
 # ---------- Stripe Settings ----------
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY", "pk_test_XXXXXXXXXXXXXXXX")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "sk_test_XXXXXXXXXXXXXXXX")